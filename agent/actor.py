@@ -1,27 +1,31 @@
 # Acting module: Generate improvement suggestions
 from model.base_model import CodeReviewLLM
 from utils.code_parser import extract_code_block
+from agent.prompts import build_code_prefix
 
 class Actor:
     def __init__(self, llm: CodeReviewLLM):
         self.llm = llm
 
-    def act(self, code_snippet, plan, language):
-        prompt = f"""
-[INST]
-You are an expert programmer. Based on the following plan, rewrite the given {language} code snippet to implement the suggested improvements.
-Your response must contain *only* the complete, final code block, with no explanations or conversational text.
-
+    def act(self, code_snippet, plan, language, on_token=None):
+        prefix = build_code_prefix(code_snippet, language)
+        prompt = prefix + f"""
 **Improvement Plan:**
 {plan}
 
-**Original Code:**
-```python
-{code_snippet}
+Based on the plan, rewrite the code snippet above to implement the suggested improvements.
+Your response must contain *only* the complete, final code block in a ```{language} fence, with no explanations or conversational text.
 Provide the improved code now.
 [/INST]
 """
-        suggestion = self.llm.generate(prompt)
-        raw_code = suggestion.split("[/INST]")[-1].strip()
-        improved_code = extract_code_block(raw_code, language)
-        return improved_code
\ No newline at end of file
+        # The rewrite copies long spans of the input, which speculative decoding accepts in bulk
+        suggestion = self.llm.generate(
+            prompt,
+            max_new_tokens=self.llm.token_budget(code_snippet, "rewrite"),
+            prefix=prefix,
+            speculative=True,
+            stop_at_code_fence=language,
+            on_token=on_token
+        )
+        improved_code = extract_code_block(suggestion.strip(), language)
+        return improved_code
@@ -1,4 +1,5 @@
 # Overall Agent workflow
+import time
 from model.base_model import CodeReviewLLM
 from agent.planner import Planner
 from agent.actor import Actor
@@ -11,16 +12,39 @@ class CodeReviewAgent:
         self.actor = Actor(self.llm)
         self.reflector = Reflector()
 
-    def run(self, code_snippet, language = "python"):
+    def run(self, code_snippet, language = "python", on_token=None, checkpoint=None):
+        """
+        Plans, rewrites and reflects on a snippet. If given, `on_token(stage, text)`
+        receives the plan ("plan") and improved code ("act") as they are generated,
+        and `checkpoint(stage)` is called before each stage so the caller can abort
+        the run by raising.
+        """
         print(f"--- Running agent for {language.upper()} ---")
+        timings = {}
+
+        def stream(stage):
+            return (lambda text: on_token(stage, text)) if on_token else None
         
-        plan = self.planner.plan(code_snippet, language)
+        if checkpoint:
+            checkpoint("plan")
+        start = time.perf_counter()
+        plan = self.planner.plan(code_snippet, language, on_token=stream("plan"))
+        timings["plan"] = time.perf_counter() - start
         print(f"\n[PLAN]\n{plan}\n")
         
-        improved_code = self.actor.act(code_snippet, plan, language)
+        if checkpoint:
+            checkpoint("act")
+        start = time.perf_counter()
+        improved_code = self.actor.act(code_snippet, plan, language, on_token=stream("act"))
+        timings["act"] = time.perf_counter() - start
         print(f"\n[IMPROVED CODE]\n{improved_code}\n")
         
-        reward, notes = self.reflector.reflect(code_snippet, improved_code, language)
+        if checkpoint:
+            checkpoint("reflect")
+        start = time.perf_counter()
+        reward, notes, metric_timings = self.reflector.reflect_with_timings(code_snippet, improved_code, language)
+        timings["reflect"] = time.perf_counter() - start
+        timings["reflect_metrics"] = metric_timings
         print(f"\n[REFLECTION]\n{notes}\n")
 
         return {
@@ -28,5 +52,6 @@ class CodeReviewAgent:
             "original_code": code_snippet,
             "improved_code": improved_code,
             "reward": reward,
-            "notes": notes
+            "notes": notes,
+            "timings": timings  # Seconds spent in each stage
         }
\ No newline at end of file
@@ -1,28 +1,29 @@
 # Planning module: Analyze code and identify issues
 from model.base_model import CodeReviewLLM
 from tools.static_analysis import analyze_code
+from agent.prompts import build_code_prefix
 
 class Planner:
     def __init__(self, llm: CodeReviewLLM):
         self.llm = llm
 
-    def plan(self, code_snippet, language):
+    def plan(self, code_snippet, language, on_token=None):
         analysis_results = analyze_code(code_snippet, language)
         
-        prompt = f"""
-[INST]
-You are a code quality expert. Analyze the following {language} code and the report from its static analysis tool.
-Based on this information, create a concise, high-level plan with bullet points on how to improve the code. Focus on readability, performance, security, and style.
-
+        prefix = build_code_prefix(code_snippet, language)
+        prompt = prefix + f"""
 **Static Analysis Report:**
 {analysis_results if analysis_results else "No issues found."}
 
-**Code Snippet:**
-```python
-{code_snippet}
+Analyze the code snippet above and the report from its static analysis tool.
+Based on this information, create a concise, high-level plan with bullet points on how to improve the code. Focus on readability, performance, security, and style.
 What is your improvement plan?
 [/INST]
 """
-        response = self.llm.generate(prompt)
-        plan_text = response.split("[/INST]")[-1].strip()
-        return plan_text
\ No newline at end of file
+        response = self.llm.generate(
+            prompt,
+            max_new_tokens=self.llm.token_budget(code_snippet, "plan"),
+            prefix=prefix,
+            on_token=on_token
+        )
+        return response.strip()
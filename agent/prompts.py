@@ -0,0 +1,15 @@
+# Shared prompt building blocks
+# Planner and Actor prompts both start with the same preamble and code block so
+# the model layer can reuse the KV cache of that prefix between the two calls.
+
+def build_code_prefix(code_snippet, language):
+    """Returns the instruction preamble and code block shared by every prompt of a review."""
+    return f"""
+[INST]
+You are an expert {language} programmer and code quality reviewer.
+
+**Code Snippet:**
+```{language}
+{code_snippet}
+```
+"""
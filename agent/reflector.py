@@ -1,5 +1,5 @@
 # Reflection module: Evaluate improvements and provide feedback for PPO
-from tools.metrics import calculate_reward
+from tools.metrics import calculate_reward, calculate_reward_with_timings
 
 class Reflector:
     def reflect(self, original_code, improved_code, language):
@@ -22,3 +22,10 @@ class Reflector:
             language
         )
         return reward, notes
+
+    def reflect_with_timings(self, original_code, improved_code, language):
+        """
+        Same as `reflect`, plus a dict of seconds spent on each metric
+        evaluation (e.g. "style_original").
+        """
+        return calculate_reward_with_timings(original_code, improved_code, language)
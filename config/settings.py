@@ -3,7 +3,34 @@ import os
 
 # Model settings
 MODEL_NAME = "codellama/CodeLlama-7b-Instruct-hf"  # Or "Salesforce/codet5p-220m"
-DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+# "auto" picks CUDA when available. Resolved in model/base_model.py so that importing
+# settings (e.g. from the API process) never pulls in torch.
+DEVICE = os.getenv("MODEL_DEVICE", "auto")
+
+# Dynamic micro-batching for CodeReviewLLM.generate (see model/inference_engine.py)
+INFERENCE_ENGINE_CONFIG = {
+    "max_batch_size": 8,        # Maximum number of prompts per model.generate call
+    "max_wait_ms": 20,          # How long the first prompt of a batch waits for others to join
+    "max_batch_tokens": 16384,  # Budget of padded (prompt + new) tokens per batch
+    # Total tokens of prompt prefixes (preamble + code block) whose KV cache is kept.
+    # KV memory is per token: ~0.5 MB each for a 7B model in fp16, so 4096 tokens pin ~2 GB.
+    "prefix_cache_max_tokens": 4096,
+}
+
+# Opt-in speculative decoding for code-rewrite generations (Actor), which mostly copy their input.
+SPECULATIVE_DECODING = {
+    "mode": os.getenv("SPECULATIVE_DECODING_MODE", "off"),  # "off", "prompt_lookup" or "draft_model"
+    "num_speculative_tokens": 10,   # Tokens drafted per verification step
+    "max_matching_ngram_size": 3,   # Longest n-gram matched against the prompt ("prompt_lookup")
+    "draft_model_name": os.getenv("DRAFT_MODEL_NAME"),  # Small model sharing MODEL_NAME's tokenizer ("draft_model")
+}
+
+# Generation budgets derived from the token length of the reviewed snippet:
+# max_new_tokens = clamp(ratio * snippet_tokens, min, max)
+TOKEN_BUDGETS = {
+    "plan": {"ratio": 0.5, "min": 128, "max": 384},
+    "rewrite": {"ratio": 1.3, "min": 64, "max": 2048},  # Rewrites also stop at the closing code fence
+}
 
 # PPO Training settings for the TRL library
 PPO_CONFIG = {
@@ -33,8 +60,142 @@ REWARD_WEIGHTS = {
 }
 
 
+# Static analysis engine used by tools/static_analysis.py and tools/metrics.py
+STATIC_ANALYSIS_CONFIG = {
+    "mode": os.getenv("STATIC_ANALYSIS_MODE", "pool"),  # "pool" (warm in-process workers) or "subprocess"
+    "pool_size": 4,               # Long-lived analyzer processes (the reward fans out 4 Python analyses at once)
+    "timeout_seconds": 30,        # Per-call limit; a timed-out pool is replaced
+    "max_tasks_per_worker": 200,  # Recycle workers periodically to bound the astroid cache
+}
+
+# Persistent ESLint daemon (tools/lint_daemon.js) used for JavaScript linting
+LINT_DAEMON_CONFIG = {
+    "enabled": os.getenv("ESLINT_DAEMON", "1") == "1",  # "0" shells out to node_modules/.bin/eslint per lint
+    "timeout_seconds": 30,  # Per-lint limit before the daemon is restarted
+}
+
+# Reward computation in tools/metrics.py
+REWARD_CONFIG = {
+    "mode": os.getenv("REWARD_MODE", "parallel"),  # "parallel" (fan out the 8 metric evaluations) or "serial"
+    # Threads evaluating metrics; the analyzers are CPU-bound, so more threads than cores only adds contention
+    "max_workers": int(os.getenv("REWARD_MAX_WORKERS", min(8, os.cpu_count() or 1))),
+}
+
+# Content-addressed cache of analyzer and metric outputs (tools/result_cache.py)
+ANALYSIS_CACHE_CONFIG = {
+    "backend": os.getenv("ANALYSIS_CACHE_BACKEND", "redis"),  # "redis", "disk" or "none" (in-process LRU only)
+    "max_local_entries": 1024,      # In-process LRU tier in front of the backend
+    "ttl_seconds": 7 * 24 * 3600,   # Expiry of Redis entries
+    "disk_path": ".cache/analysis",  # Directory of the "disk" backend
+    "max_disk_entries": 100000,     # Oldest files beyond this are evicted
+}
+
+
 # Data paths
 DATASET_PATH = "data/code_review_dataset.json"  # Path to dataset,support json and csv files
 
+# Worker settings
+# "simple" runs jobs inside the worker process (required on CUDA);
+# "fork" loads the model once and forks a copy-on-write work horse per job.
+WORKER_MODE = os.getenv("WORKER_MODE", "simple")
+
+# Job scheduling (service/task_queue.py, service/worker.py)
+QUEUE_CONFIG = {
+    # Priority lanes, highest first: a worker always takes interactive jobs before webhook ones
+    "lanes": ["interactive", "webhook"],
+    # Lanes this worker serves (comma separated), e.g. "interactive" for a dedicated low-latency worker
+    "worker_lanes": [lane for lane in os.getenv("WORKER_LANES", "interactive,webhook").split(",") if lane],
+    # Relative share of a lane's throughput per tenant (repository full name or API client); default 1
+    "tenant_weights": {},
+    "refresh_seconds": 5,  # How often an idle worker rescans for newly active tenants
+}
+
+# API rate limits, shared by all API processes through Redis (slowapi / limits)
+RATE_LIMIT_CONFIG = {
+    "storage_uri": os.getenv("RATE_LIMIT_STORAGE_URI", f"redis://{os.getenv('REDIS_HOST', 'localhost')}:6379"),
+    "review_per_client": "5/minute",   # POST /review and /review/stream, per client address
+    "review_global": os.getenv("REVIEW_GLOBAL_RATE_LIMIT", "120/minute"),  # Same endpoints, all clients together
+}
+
+# Admission control for interactive reviews (service/admission.py)
+ADMISSION_CONFIG = {
+    "max_queue_wait_seconds": 120,     # Reject when backlog / observed service rate exceeds this
+    "max_queue_depth": 200,            # Hard bound on queued interactive jobs
+    "rate_window_seconds": 300,        # Window over which the service rate is measured
+    "default_retry_after_seconds": 30,  # Retry-After when no recent throughput is known
+}
+
+# Pull request reviews: "changed_units" reviews only the functions/classes enclosing the
+# changed hunks of each file (service/code_units.py), "file" reviews whole files
+REVIEW_SCOPE = os.getenv("REVIEW_SCOPE", "changed_units")
+# Each unit is a separate agent run: with more changed units, the file's top-level units are
+# reviewed instead (mostly from cache), and with more of those the file is reviewed as one unit
+MAX_REVIEW_UNITS_PER_FILE = 8
+GITHUB_COMMENT_MAX_CHARS = 65536  # GitHub rejects longer comment bodies; longer reviews are split into parts
+
+# Per-unit semantic review cache (service/review_cache.py)
+REVIEW_CACHE_CONFIG = {
+    "ttl_seconds": int(os.getenv("REVIEW_CACHE_TTL_SECONDS", 86400)),  # Expiry of Redis entries
+    "refresh_ttl_on_hit": True,  # Hits extend the entry's expiry, so frequently seen code stays cached
+    "max_local_entries": 512,    # In-process LRU tier (compressed reviews) in front of Redis
+    "local_ttl_seconds": 300,    # Local entries are re-read from Redis (refreshing their TTL) after this long
+    "compression_level": 6,      # zlib level of stored reviews
+    # Reviews are namespaced by what produced them; changing any of these starts a fresh cache
+    "model": MODEL_NAME,
+    "adapter": os.getenv("REVIEW_ADAPTER_VERSION", "none"),  # Version of the LoRA adapter served, if any
+    "prompt_files": ["agent/prompts.py", "agent/planner.py", "agent/actor.py"],  # Hashed as the prompt version
+}
+
+# Single-flight review of identical units (service/single_flight.py): while one worker reviews a
+# unit under a Redis lease, workers missing the cache for the same unit wait for its result
+SINGLE_FLIGHT_CONFIG = {
+    "enabled": os.getenv("REVIEW_SINGLE_FLIGHT", "1") == "1",
+    "lease_seconds": 30,         # Lease length; the holder renews it every lease_seconds / 3
+    "max_poll_seconds": 1.0,     # Longest pause between a waiting worker's cache checks
+    "max_wait_seconds": 900,     # A waiting worker gives up and reviews the unit itself after this long
+}
+
+# MinHash/LSH lookup of near-duplicate units on review cache misses (service/near_duplicate.py)
+NEAR_DUPLICATE_CONFIG = {
+    # "on" serves near-duplicate reviews, "shadow" only records what it would have served, "off" skips the index
+    "mode": os.getenv("NEAR_DUPLICATE_MODE", "shadow"),
+    "backend": os.getenv("NEAR_DUPLICATE_BACKEND", "redis"),  # "redis" (shared) or "local" (in-process)
+    "threshold": float(os.getenv("NEAR_DUPLICATE_THRESHOLD", 0.8)),  # Minimum estimated Jaccard similarity
+    "num_perm": 128,     # MinHash signature length
+    "bands": 16,         # LSH bands of num_perm / bands rows each
+    "shingle_size": 3,   # Tokens per shingle
+    "max_band_entries": 256,  # Newest ids kept per LSH band ("redis" backend)
+}
+
+# Async GitHub API client used to fetch pull request files (service/github_client.py)
+GITHUB_CLIENT_CONFIG = {
+    "max_concurrency": 8,        # Requests in flight at once per client
+    "max_connections": 20,       # Pooled keep-alive connections
+    "timeout_seconds": 30,
+    "etag_cache_entries": 1024,  # Responses kept for If-None-Match revalidation
+    "max_retries": 3,            # On rate limiting and 5xx responses
+    "max_backoff_seconds": 60,   # Longest wait for a rate-limit reset before giving up
+}
+
+# GitHub retries webhook deliveries; X-GitHub-Delivery ids are remembered this long to drop duplicates
+WEBHOOK_DELIVERY_TTL_SECONDS = 24 * 3600
+PR_HEAD_TTL_SECONDS = 7 * 24 * 3600  # Latest head SHA per PR, used to cancel reviews of superseded pushes
+
+# Review results for GET /review/{job_id}
+REVIEW_RESULT_TTL_SECONDS = int(os.getenv("REVIEW_RESULT_TTL_SECONDS", 3600))  # How long finished results are kept
+LONG_POLL_MAX_SECONDS = 60  # Upper bound for the `timeout` query parameter
+STREAM_IDLE_TIMEOUT_SECONDS = 120  # SSE streams close if the worker sends nothing for this long
+REVIEW_STREAM_MAX_EVENTS = 10000  # Approximate cap on the length of a job's token stream
+
 #Training Data Log Path used to record interation, can be used for training
 TRAINING_LOG_PATH = "training_logs/interactions.csv"
+
+# Buffered training log writer (service/training_data_logger.py). Every process appends
+# to its own segment files next to TRAINING_LOG_PATH; sealed segments are listed in
+# "<TRAINING_LOG_PATH>.manifest.jsonl", which data/load_dataset.py reads
+TRAINING_LOG_CONFIG = {
+    "flush_interval_seconds": 1.0,          # Background flush period
+    "max_buffered_records": 256,            # Flush early once this many records are buffered
+    "max_segment_bytes": 64 * 1024 * 1024,  # Rotate a segment past this size...
+    "max_segment_seconds": 600,             # ...or this age, so the trainer sees recent data
+}
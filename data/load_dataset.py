@@ -3,6 +3,7 @@ import csv
 import os
 import logging
 from config.settings import DATASET_PATH
+from data.training_log_files import manifest_path_for, segment_prefix_for
 
 '''
 Expected format of the dataset file (.json/.csv)
@@ -52,6 +53,8 @@ def _load_from_csv(path):
         with open(path, 'r', newline='', encoding='utf-8') as f:
             reader = csv.DictReader(f)
             for row in reader:
+                if row.get('original_code') is None or row.get('language') is None:
+                    continue  # A row cut short in a segment that is still being written
                 # The PPO trainer expects a tuple of (query, response)
                 # Here, we adapt it to our agent's needs: (original_code, language)
                 dataset.append((row['original_code'], row['language']))
@@ -80,20 +83,54 @@ def _load_from_jsonl(path):
         logger.error(f"Error loading data from JSONL {path}: {e}")
     return dataset
 
+def _segment_paths(path):
+    """
+    Segment files written for the log at `path` by service/training_data_logger.py:
+    the sealed ones listed in its manifest, then any unsealed ones (still being
+    written by a running process, or left behind by one that crashed).
+    """
+    directory = os.path.dirname(path) or "."
+    sealed = []
+    manifest_path = manifest_path_for(path)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    sealed.append(json.loads(line)['segment'])
+                except (json.JSONDecodeError, KeyError):
+                    logger.warning(f"Skipping malformed manifest line in {manifest_path}: {line.strip()}")
+    listed = set(sealed)
+    prefix = segment_prefix_for(path)
+    extension = os.path.splitext(path)[1]
+    unsealed = sorted(
+        name for name in os.listdir(directory)
+        if name.startswith(prefix) and name.endswith(extension) and name not in listed
+    ) if os.path.isdir(directory) else []
+    if unsealed:
+        logger.info(f"Also reading {len(unsealed)} unsealed training log segment(s) in {directory}")
+    return [os.path.join(directory, name) for name in sealed + unsealed]
+
 def load_code_review_data(path):
     """
     Loads the code review training data
     This function is called by `ppo_trainer.py`.
+    `path` is TRAINING_LOG_PATH: the records are read from its segment files,
+    and from the file itself if an older version of the service wrote it.
     """
-    if not os.path.exists(path):
+    paths = ([path] if os.path.exists(path) else []) + _segment_paths(path)
+    if not paths:
         logger.warning(f"No training log file found at '{path}'. Cannot start training.")
         return []
 
     file_extension = os.path.splitext(path)[1].lower()
 
     if file_extension == '.csv':
-        return _load_from_csv(path)
+        load_file = _load_from_csv
     elif file_extension == '.jsonl':
-        return _load_from_jsonl(path)
+        load_file = _load_from_jsonl
     else:
         raise ValueError(f"Unsupported log format: '{file_extension}'. Please use '.csv' or '.jsonl'.")
+    dataset = []
+    for file_path in paths:
+        dataset.extend(load_file(file_path))
+    return dataset
@@ -0,0 +1,19 @@
+# File layout of the segmented training data log.
+# Shared by the writer (service/training_data_logger.py) and the dataset loader
+# (data/load_dataset.py), so the trainer can find segments without importing
+# the service tier and creating a log writer of its own.
+#
+# For TRAINING_LOG_PATH = "training_logs/interactions.csv":
+#   segments: training_logs/interactions-<host>-<pid>-<start time>-<n>.csv
+#   manifest: training_logs/interactions.csv.manifest.jsonl
+import os
+
+
+def manifest_path_for(log_path: str) -> str:
+    return log_path + ".manifest.jsonl"
+
+
+def segment_prefix_for(log_path: str) -> str:
+    """File name prefix shared by all segments of `log_path`."""
+    stem, _ = os.path.splitext(os.path.basename(log_path))
+    return stem + "-"
@@ -1,26 +1,51 @@
 # LLM base model encapsulation
 from transformers import AutoModelForCausalLM, AutoTokenizer
 import torch
-from config.settings import MODEL_NAME, DEVICE
+from config.settings import MODEL_NAME, DEVICE as DEVICE_SETTING, INFERENCE_ENGINE_CONFIG, SPECULATIVE_DECODING, TOKEN_BUDGETS
+from model.inference_engine import InferenceEngine
+
+if DEVICE_SETTING == "auto":
+    DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+else:
+    DEVICE = DEVICE_SETTING
 
 class CodeReviewLLM:
     def __init__(self):
         self.tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
         self.model = AutoModelForCausalLM.from_pretrained(MODEL_NAME).to(DEVICE)
         self.tokenizer.pad_token = self.tokenizer.eos_token
+        # Decoder-only models must be left-padded so every row ends at the generation position
+        self.tokenizer.padding_side = "left"
+        self.draft_model = None
+        if SPECULATIVE_DECODING["mode"] == "draft_model":
+            self.draft_model = AutoModelForCausalLM.from_pretrained(SPECULATIVE_DECODING["draft_model_name"]).to(DEVICE)
+        self.engine = InferenceEngine(
+            self.model,
+            self.tokenizer,
+            generation_kwargs={"do_sample": True, "temperature": 0.2, "top_p": 0.95},
+            speculative_config=SPECULATIVE_DECODING,
+            draft_model=self.draft_model,
+            **INFERENCE_ENGINE_CONFIG
+        )
+
+    def token_budget(self, code_snippet, kind):
+        # max_new_tokens proportional to the snippet being reviewed; `kind` is a key of TOKEN_BUDGETS
+        budget = TOKEN_BUDGETS[kind]
+        tokens = int(self.engine.count_tokens(code_snippet) * budget["ratio"])
+        return max(budget["min"], min(budget["max"], tokens))
 
-    def generate(self, prompt, max_new_tokens=250):
-        inputs = self.tokenizer(prompt, return_tensors="pt", padding=True, truncation=True).to(DEVICE)
-        
-        with torch.no_grad():
-            outputs = self.model.generate(
-                **inputs,
-                max_new_tokens=max_new_tokens,
-                do_sample=True,
-                temperature=0.2,
-                top_p=0.95,
-                pad_token_id=self.tokenizer.eos_token_id
-            )
-        
-        response = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-        return response
\ No newline at end of file
+    def generate(self, prompt, max_new_tokens=250, prefix=None, speculative=False, stop_at_code_fence=None,
+                 on_token=None):
+        # Thin client: the engine batches this prompt with any concurrent callers and returns only the new text.
+        # `prefix` marks the leading part of the prompt shared with other calls so its KV cache can be reused.
+        # `speculative` opts into the speculative decoding mode configured in SPECULATIVE_DECODING.
+        # `stop_at_code_fence` (a language) ends generation as soon as the code block is closed.
+        # `on_token` receives chunks of generated text as they are produced (for streaming).
+        return self.engine.generate(
+            prompt,
+            max_new_tokens=max_new_tokens,
+            prefix=prefix,
+            speculative=speculative,
+            stop_at_code_fence=stop_at_code_fence,
+            on_token=on_token
+        )
@@ -0,0 +1,364 @@
+# Dynamic micro-batching inference engine
+# Concurrent callers (Planner/Actor calls from any number of jobs or threads)
+# submit single prompts; a background thread groups whatever is waiting into
+# left-padded batches and runs one `model.generate` per batch.
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+import torch
+from transformers import StoppingCriteriaList, TextStreamer
+from model.prefix_cache import PrefixKVCache
+from model.stopping_criteria import CodeFenceStoppingCriteria
+
+
+class GenerationRequest:
+    """A single prompt waiting for the engine, plus the future its caller blocks on."""
+
+    def __init__(self, prompt, max_new_tokens, prefix=None, speculative=False, stop_at_code_fence=None,
+                 on_token=None):
+        self.prompt = prompt
+        self.max_new_tokens = max_new_tokens
+        self.prefix = prefix
+        self.speculative = speculative
+        self.stop_at_code_fence = stop_at_code_fence
+        self.on_token = on_token
+        self.future = Future()
+        self.input_ids = None
+        self.prefix_ids = None
+
+    @property
+    def runs_alone(self):
+        # Assisted generation and streamers only support a batch size of 1
+        return self.speculative or self.on_token is not None
+
+
+class CallbackStreamer(TextStreamer):
+    """Streams decoded text of the new tokens to a callback as it is generated."""
+
+    def __init__(self, tokenizer, callback, tokenizer_lock):
+        super().__init__(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        self.callback = callback
+        self.tokenizer_lock = tokenizer_lock
+
+    def put(self, value):
+        with self.tokenizer_lock:
+            super().put(value)
+
+    def end(self):
+        with self.tokenizer_lock:
+            super().end()
+
+    def on_finalized_text(self, text, stream_end=False):
+        if text:
+            self.callback(text)
+
+
+class InferenceEngine:
+    """
+    Batches concurrent `generate` calls onto one model.
+
+    A batch is closed when it reaches `max_batch_size`, when `max_wait_ms` has
+    passed since its first request arrived, or when adding the next request
+    would exceed `max_batch_tokens` (counted as padded prompt + new tokens per
+    row). A request that does not fit is carried over to the next batch.
+
+    Requests may name a shared `prefix` of their prompt. When such a request
+    runs on its own (the model is not saturated), the prefix's KV cache is
+    reused from earlier calls and only the remaining tokens are prefilled.
+    At most `prefix_cache_max_tokens` prefix tokens are kept cached in total.
+    Speculative requests do not use the prefix cache.
+
+    Requests flagged `speculative` (code rewrites that mostly copy their input)
+    always run alone, using the decoding mode from `speculative_config`:
+    "prompt_lookup" drafts tokens from n-grams of the prompt, "draft_model"
+    drafts them with `draft_model`, which must share the tokenizer.
+
+    Requests with an `on_token` callback also run alone and receive their
+    text as it is generated.
+
+    Every row stops on its own budget, or at the closing fence of its code
+    block when it sets `stop_at_code_fence`, and callers receive only the
+    newly generated text.
+    """
+
+    def __init__(self, model, tokenizer, max_batch_size=8, max_wait_ms=20, max_batch_tokens=16384,
+                 prefix_cache_max_tokens=4096, generation_kwargs=None, speculative_config=None, draft_model=None):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_tokens = max_batch_tokens
+        self.generation_kwargs = generation_kwargs or {}
+        self.prefix_cache = PrefixKVCache(prefix_cache_max_tokens)
+        self.speculative_config = speculative_config or {"mode": "off"}
+        self.draft_model = draft_model
+        self._speculative_kwargs = self._build_speculative_kwargs()
+
+        self._thread = None
+        self._thread_pid = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "requests": 0, "batches": 0, "generated_tokens": 0, "generate_seconds": 0.0,
+            "speculative_requests": 0, "speculative_tokens": 0, "speculative_seconds": 0.0,
+            "speculative_steps": 0, "speculative_drafted_tokens": 0,
+        }
+        self._target_forwards = 0
+        if self._speculative_kwargs:
+            # Counting target-model forward passes tells us how many tokens each verification step accepted
+            self.model.register_forward_hook(self._count_forward)
+
+        self._ensure_thread()
+
+    def _ensure_thread(self):
+        """
+        Starts the engine thread of this process. Threads do not survive a fork,
+        so a forked RQ work horse inheriting the engine starts its own thread,
+        with a fresh queue and locks (the parent's may have been held at fork time).
+        """
+        if self._thread_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._requests = queue.Queue()
+            # Fast tokenizers must not be used from several threads at once
+            self._tokenizer_lock = threading.Lock()
+            self._carry_over = deque()
+            self._stats_lock = threading.Lock()
+            self._thread = threading.Thread(target=self._run, name="inference-engine", daemon=True)
+            self._thread.start()
+            self._thread_pid = os.getpid()
+
+    def submit(self, prompt, max_new_tokens=250, prefix=None, speculative=False, stop_at_code_fence=None,
+               on_token=None) -> Future:
+        """
+        Queues a prompt and returns a future resolving to its generated text
+        (the prompt is not included).
+        `prefix`, if given, must be a leading substring of `prompt` that other
+        prompts share (e.g. the instruction preamble and code block).
+        `speculative` opts the request into speculative decoding, if enabled.
+        `stop_at_code_fence` names a language; generation stops once the
+        ```<language> block it opened is closed.
+        `on_token` is called on the engine thread with each new chunk of text.
+        """
+        self._ensure_thread()
+        request = GenerationRequest(
+            prompt, max_new_tokens, prefix, speculative and bool(self._speculative_kwargs), stop_at_code_fence,
+            on_token
+        )
+        self._requests.put(request)
+        return request.future
+
+    def generate(self, prompt, max_new_tokens=250, prefix=None, speculative=False, stop_at_code_fence=None,
+                 on_token=None) -> str:
+        """Blocking helper: submits a prompt and waits for its output."""
+        return self.submit(prompt, max_new_tokens, prefix, speculative, stop_at_code_fence, on_token).result()
+
+    def count_tokens(self, text) -> int:
+        """Token length of `text`, safe to call from any thread."""
+        self._ensure_thread()
+        with self._tokenizer_lock:
+            return len(self.tokenizer(text, add_special_tokens=False)["input_ids"])
+
+    def stats(self) -> dict:
+        """
+        Returns a copy of the engine counters, including the mean batch size and,
+        for speculative requests, tokens/sec and the draft acceptance rate.
+        The acceptance rate assumes every step drafted `num_speculative_tokens`,
+        so it is a lower bound when prompt lookup finds no match.
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["mean_batch_size"] = stats["requests"] / max(stats["batches"], 1)
+        stats["speculative_tokens_per_second"] = stats["speculative_tokens"] / max(stats["speculative_seconds"], 1e-9)
+        stats["speculative_tokens_per_step"] = stats["speculative_tokens"] / max(stats["speculative_steps"], 1)
+        accepted = stats["speculative_tokens"] - stats["speculative_steps"]
+        stats["speculative_acceptance_rate"] = max(accepted, 0) / max(stats["speculative_drafted_tokens"], 1)
+        stats.update(self.prefix_cache.stats())
+        return stats
+
+    def _build_speculative_kwargs(self):
+        mode = self.speculative_config.get("mode", "off")
+        num_tokens = self.speculative_config.get("num_speculative_tokens", 10)
+        if mode == "off":
+            return {}
+        if mode == "prompt_lookup":
+            return {
+                "prompt_lookup_num_tokens": num_tokens,
+                "max_matching_ngram_size": self.speculative_config.get("max_matching_ngram_size", 3),
+            }
+        if mode == "draft_model":
+            if self.draft_model is None:
+                raise ValueError("Speculative mode 'draft_model' requires a draft model.")
+            # A constant draft length keeps the acceptance-rate statistics meaningful
+            self.draft_model.generation_config.num_assistant_tokens = num_tokens
+            self.draft_model.generation_config.num_assistant_tokens_schedule = "constant"
+            return {"assistant_model": self.draft_model}
+        raise ValueError(f"Unsupported speculative decoding mode: '{mode}'. Use 'off', 'prompt_lookup' or 'draft_model'.")
+
+    def _count_forward(self, module, args, output):
+        self._target_forwards += 1
+
+    def _next_request(self, timeout):
+        if self._carry_over:
+            return self._carry_over.popleft()
+        request = self._requests.get(timeout=timeout)
+        with self._tokenizer_lock:
+            if request.prefix and request.prompt.startswith(request.prefix):
+                # Tokenize the prefix on its own so its ids are identical for every prompt sharing it
+                request.prefix_ids = self.tokenizer(request.prefix)["input_ids"]
+                suffix_ids = self.tokenizer(request.prompt[len(request.prefix):], add_special_tokens=False)["input_ids"]
+                request.input_ids = request.prefix_ids + suffix_ids
+            else:
+                request.input_ids = self.tokenizer(request.prompt, truncation=True)["input_ids"]
+        return request
+
+    def _stopping_criteria(self, batch, prompt_length):
+        return StoppingCriteriaList([
+            CodeFenceStoppingCriteria(
+                self.tokenizer,
+                prompt_length,
+                [request.stop_at_code_fence for request in batch],
+                [request.max_new_tokens for request in batch],
+                self._tokenizer_lock,
+            )
+        ])
+
+    def _collect_batch(self):
+        batch = [self._next_request(timeout=None)]
+        if batch[0].runs_alone:
+            return batch
+        longest = len(batch[0].input_ids)
+        longest_new = batch[0].max_new_tokens
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 and not self._carry_over:
+                break
+            try:
+                request = self._next_request(timeout=max(remaining, 0))
+            except queue.Empty:
+                break
+            if request.runs_alone:
+                self._carry_over.appendleft(request)
+                break
+            padded_cost = (len(batch) + 1) * (max(longest, len(request.input_ids)) + max(longest_new, request.max_new_tokens))
+            if padded_cost > self.max_batch_tokens:
+                self._carry_over.appendleft(request)
+                break
+            batch.append(request)
+            longest = max(longest, len(request.input_ids))
+            longest_new = max(longest_new, request.max_new_tokens)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            try:
+                if len(batch) == 1 and (batch[0].prefix_ids or batch[0].runs_alone):
+                    self._generate_single(batch[0])
+                else:
+                    self._generate_batch(batch)
+            except Exception as e:
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+
+    def _generate_batch(self, batch):
+        with self._tokenizer_lock:
+            inputs = self.tokenizer.pad(
+                {"input_ids": [request.input_ids for request in batch]},
+                padding=True,
+                return_tensors="pt",
+            ).to(self.model.device)
+        prompt_length = inputs["input_ids"].shape[1]
+        max_new_tokens = max(request.max_new_tokens for request in batch)
+
+        start = time.perf_counter()
+        with torch.no_grad():
+            outputs = self.model.generate(
+                **inputs,
+                max_new_tokens=max_new_tokens,
+                stopping_criteria=self._stopping_criteria(batch, prompt_length),
+                pad_token_id=self.tokenizer.eos_token_id,
+                **self.generation_kwargs,
+            )
+        elapsed = time.perf_counter() - start
+        self._finish(batch, outputs, prompt_length, elapsed)
+
+    def _generate_single(self, request):
+        device = self.model.device
+        generation_kwargs = dict(self.generation_kwargs)
+        if request.speculative:
+            generation_kwargs.update(self._speculative_kwargs)
+        if request.on_token is not None:
+            generation_kwargs["streamer"] = CallbackStreamer(self.tokenizer, request.on_token, self._tokenizer_lock)
+
+        start = time.perf_counter()
+        with torch.no_grad():
+            past_key_values = None
+            # Speculative decoding (prompt lookup and assisted generation) does not produce the same
+            # greedy output when started from a prefilled cache, so speculative requests prefill in full
+            if request.prefix_ids and not request.speculative:
+                past_key_values = self.prefix_cache.get(request.prefix_ids)
+                if past_key_values is None:
+                    prefix_tensor = torch.tensor([request.prefix_ids], device=device)
+                    past_key_values = self.model(input_ids=prefix_tensor, use_cache=True).past_key_values
+                    self.prefix_cache.put(request.prefix_ids, past_key_values)
+
+            input_ids = torch.tensor([request.input_ids], device=device)
+            forwards_before = self._target_forwards
+            try:
+                # With a cached prefix, generate() only prefills the tokens past it
+                outputs = self.model.generate(
+                    input_ids=input_ids,
+                    attention_mask=torch.ones_like(input_ids),
+                    past_key_values=past_key_values,
+                    max_new_tokens=request.max_new_tokens,
+                    stopping_criteria=self._stopping_criteria([request], input_ids.shape[1]),
+                    pad_token_id=self.tokenizer.eos_token_id,
+                    **generation_kwargs,
+                )
+            finally:
+                if past_key_values is not None:
+                    # generate() extends the cache in place; drop everything after the prefix
+                    extra_tokens = past_key_values.get_seq_length() - len(request.prefix_ids)
+                    if extra_tokens > 0:
+                        past_key_values.crop(-extra_tokens)
+        elapsed = time.perf_counter() - start
+        # The first forward pass is the prefill; each later one verifies a drafted block
+        speculative_steps = max(self._target_forwards - forwards_before - 1, 0) if request.speculative else None
+        self._finish([request], outputs, input_ids.shape[1], elapsed, speculative_steps)
+
+    def _finish(self, batch, outputs, prompt_length, elapsed, speculative_steps=None):
+        generated_tokens = 0
+        responses = []
+        for row, request in enumerate(batch):
+            # Only the new tokens are decoded; rows that stopped early are padded with eos, which is skipped.
+            new_tokens = outputs[row, prompt_length:prompt_length + request.max_new_tokens]
+            generated_tokens += int((new_tokens != self.tokenizer.eos_token_id).sum())
+            with self._tokenizer_lock:
+                responses.append(self.tokenizer.decode(new_tokens, skip_special_tokens=True))
+
+        # Record stats before resolving the futures so callers always see their own request counted
+        with self._stats_lock:
+            self._stats["requests"] += len(batch)
+            self._stats["batches"] += 1
+            self._stats["generated_tokens"] += generated_tokens
+            self._stats["generate_seconds"] += elapsed
+            if speculative_steps is not None:
+                self._stats["speculative_requests"] += 1
+                self._stats["speculative_tokens"] += generated_tokens
+                self._stats["speculative_seconds"] += elapsed
+                self._stats["speculative_steps"] += speculative_steps
+                self._stats["speculative_drafted_tokens"] += (
+                    speculative_steps * self.speculative_config.get("num_speculative_tokens", 10)
+                )
+
+        for request, response in zip(batch, responses):
+            request.future.set_result(response)
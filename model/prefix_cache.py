@@ -0,0 +1,57 @@
+# Prompt-prefix KV cache
+# Planner and Actor prompts for the same review start with the same preamble
+# and code block. Keeping the `past_key_values` of that prefix lets the second
+# prompt skip prefill for every matched token.
+#
+# KV memory grows with the number of cached tokens, not entries: for a 7B model
+# in fp16 each token holds ~0.5 MB (2 x 32 layers x 4096 dims x 2 bytes), so a
+# 2k-token prefix pins ~1 GB. The cache is therefore bounded by total tokens.
+from collections import OrderedDict
+
+
+class PrefixKVCache:
+    """
+    LRU of `past_key_values` keyed by the exact token ids of a prompt prefix,
+    holding at most `max_tokens` prefix tokens in total.
+    """
+
+    def __init__(self, max_tokens=4096):
+        self.max_tokens = max_tokens
+        self._entries = OrderedDict()
+        self.tokens = 0
+        self.hits = 0
+        self.misses = 0
+        self.reused_tokens = 0
+
+    def get(self, prefix_ids):
+        key = tuple(prefix_ids)
+        past_key_values = self._entries.get(key)
+        if past_key_values is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        self.reused_tokens += len(key)
+        return past_key_values
+
+    def put(self, prefix_ids, past_key_values):
+        key = tuple(prefix_ids)
+        if len(key) > self.max_tokens:
+            return  # Would evict everything else and still not fit
+        if key in self._entries:
+            del self._entries[key]
+            self.tokens -= len(key)
+        while self._entries and self.tokens + len(key) > self.max_tokens:
+            evicted, _ = self._entries.popitem(last=False)
+            self.tokens -= len(evicted)
+        self._entries[key] = past_key_values
+        self.tokens += len(key)
+
+    def stats(self) -> dict:
+        return {
+            "prefix_cache_entries": len(self._entries),
+            "prefix_cache_tokens": self.tokens,
+            "prefix_cache_hits": self.hits,
+            "prefix_cache_misses": self.misses,
+            "prefix_cache_reused_tokens": self.reused_tokens,
+        }
@@ -0,0 +1,45 @@
+# Stopping criteria for batched generation
+import re
+import threading
+import torch
+from transformers import StoppingCriteria
+
+
+class CodeFenceStoppingCriteria(StoppingCriteria):
+    """
+    Per-row stopping for a (possibly batched) `generate` call.
+
+    A row is finished once it has used its own `max_new_tokens`, or, if it asked
+    for a code block in `fence_languages`, as soon as the closing fence of a
+    ```<language> block has been emitted. Rows are only re-decoded when one of
+    the tokens appended since the last check contains a backtick.
+    """
+
+    def __init__(self, tokenizer, prompt_length, fence_languages, max_new_tokens, tokenizer_lock=None):
+        self.tokenizer = tokenizer
+        self.tokenizer_lock = tokenizer_lock or threading.Lock()
+        self.prompt_length = prompt_length
+        self.max_new_tokens = max_new_tokens
+        self.fence_patterns = [
+            re.compile(rf"```(?:{re.escape(language)})?[ \t]*\n.*?\n[ \t]*```", re.DOTALL) if language else None
+            for language in fence_languages
+        ]
+        self._done = [False] * len(fence_languages)
+        self._checked_length = prompt_length
+
+    def __call__(self, input_ids, scores, **kwargs):
+        length = input_ids.shape[1]
+        generated = length - self.prompt_length
+        for row, pattern in enumerate(self.fence_patterns):
+            if self._done[row]:
+                continue
+            if generated >= self.max_new_tokens[row]:
+                self._done[row] = True
+            elif pattern is not None:
+                with self.tokenizer_lock:
+                    if "`" not in self.tokenizer.decode(input_ids[row, self._checked_length:length]):
+                        continue
+                    text = self.tokenizer.decode(input_ids[row, self.prompt_length:], skip_special_tokens=True)
+                self._done[row] = pattern.search(text) is not None
+        self._checked_length = length
+        return torch.tensor(self._done, dtype=torch.bool, device=input_ids.device)
@@ -0,0 +1,90 @@
+# Throughput benchmark for the micro-batching inference engine.
+# Sends the same set of concurrent requests through engines capped at
+# batch sizes 1, 4 and 8 and reports requests/sec and generated tokens/sec.
+# "check" instead verifies that greedy outputs of prompts with a shared prefix
+# are the same with and without speculative decoding, as the Actor's are.
+#
+#   python -m scripts.bench_inference_engine [num_requests] [max_new_tokens]
+#   python -m scripts.bench_inference_engine check [max_new_tokens]
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config.settings import INFERENCE_ENGINE_CONFIG, SPECULATIVE_DECODING
+from model.base_model import CodeReviewLLM
+from model.inference_engine import InferenceEngine
+
+SNIPPETS = [
+    "def add(a, b):\n    return a + b",
+    "def check_path(path):\n    if os.path.exists(path) == True:\n        print('path exists')\n    else:\n        return False",
+    "def calculate_average(numbers):\n    total = 0\n    for n in numbers:\n        total += n\n    return total / len(numbers)",
+    "function greet( name ){\n    var message = 'Hello, ' + name;\n    console.log(message)\n}",
+]
+
+def build_prompts(n):
+    return [
+        f"[INST]\nSuggest one improvement for this code:\n{SNIPPETS[i % len(SNIPPETS)]}\n[/INST]\n"
+        for i in range(n)
+    ]
+
+def run(llm, batch_size, prompts, max_new_tokens):
+    engine = InferenceEngine(
+        llm.model,
+        llm.tokenizer,
+        generation_kwargs=llm.engine.generation_kwargs,
+        **{**INFERENCE_ENGINE_CONFIG, "max_batch_size": batch_size}
+    )
+    engine.generate(prompts[0], max_new_tokens=8)  # warm-up
+    warmup_stats = engine.stats()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(prompts)) as pool:
+        list(pool.map(lambda p: engine.generate(p, max_new_tokens=max_new_tokens), prompts))
+    elapsed = time.perf_counter() - start
+
+    stats = engine.stats()
+    tokens = stats["generated_tokens"] - warmup_stats["generated_tokens"]
+    batches = stats["batches"] - warmup_stats["batches"]
+    print(
+        f"batch_size={batch_size:<2} requests={len(prompts)} batches={batches} "
+        f"time={elapsed:.2f}s req/s={len(prompts) / elapsed:.2f} tokens/s={tokens / elapsed:.1f}"
+    )
+
+def check_speculative_prefix(llm, max_new_tokens):
+    """
+    Greedy-decodes Actor-style prompts (prefix + instructions) with the prefix
+    cache alone and with speculative decoding on top; the texts must match.
+    The second prompt per snippet hits the prefix cache.
+    """
+    greedy = {"do_sample": False}
+    mode = SPECULATIVE_DECODING["mode"] if SPECULATIVE_DECODING["mode"] != "off" else "prompt_lookup"
+    reference = InferenceEngine(llm.model, llm.tokenizer, generation_kwargs=greedy, **INFERENCE_ENGINE_CONFIG)
+    speculative = InferenceEngine(
+        llm.model, llm.tokenizer, generation_kwargs=greedy,
+        speculative_config={**SPECULATIVE_DECODING, "mode": mode}, draft_model=llm.draft_model,
+        **INFERENCE_ENGINE_CONFIG
+    )
+    mismatches = 0
+    for snippet in SNIPPETS:
+        prefix = f"[INST]\nRewrite this code:\n```\n{snippet}\n```\n"
+        for instruction in ("Keep its behaviour.", "Make it shorter."):
+            prompt = f"{prefix}{instruction}\n[/INST]\n"
+            expected = reference.generate(prompt, max_new_tokens, prefix=prefix)
+            actual = speculative.generate(prompt, max_new_tokens, prefix=prefix, speculative=True)
+            if actual != expected:
+                mismatches += 1
+                print(f"MISMATCH ({mode}) for {snippet.splitlines()[0]!r} / {instruction!r}:\n"
+                      f"  expected {expected!r}\n  actual   {actual!r}")
+    total = 2 * len(SNIPPETS)
+    print(f"speculative ({mode}) + prefix: {total - mismatches}/{total} greedy outputs match")
+    return mismatches == 0
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "check":
+        max_new_tokens = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+        sys.exit(0 if check_speculative_prefix(CodeReviewLLM(), max_new_tokens) else 1)
+    num_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    max_new_tokens = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    llm = CodeReviewLLM()
+    prompts = build_prompts(num_requests)
+    for batch_size in (1, 4, 8):
+        run(llm, batch_size, prompts, max_new_tokens)
@@ -0,0 +1,85 @@
+# Benchmark: streaming structural hash vs. normalize-then-hash.
+# The baseline is the previous get_semantic_hash: normalize_python (mutate the
+# tree + ast.unparse) or normalize_javascript (toDict + copy + str), then one
+# SHA-256 of the result. Reports the mean time and peak traced memory per hash
+# on large generated files.
+#
+#   python -m scripts.bench_semantic_hash [units] [rounds]
+import hashlib
+import sys
+import time
+import tracemalloc
+from service.code_normalizer import get_semantic_hash, normalize_javascript, normalize_python
+
+PYTHON_UNIT = '''
+class Handler{i}:
+    """Handles batch {i}."""
+
+    def __init__(self, items, limit={i}):
+        self.items = list(items)
+        self.limit = limit
+
+    def process(self, factor=2):
+        results = {{}}
+        for index, item in enumerate(self.items):
+            if index > self.limit and item % factor == 0:
+                results[index] = [x * factor for x in range(item) if x % 3]
+            elif isinstance(item, str):
+                results[index] = item.strip().lower() + "_{i}"
+        return sorted(results.items(), key=lambda pair: pair[0])
+'''
+
+JAVASCRIPT_UNIT = '''
+class Handler{i} {{
+  constructor(items, limit = {i}) {{
+    this.items = [...items];
+    this.limit = limit;
+  }}
+
+  process(factor = 2) {{
+    const results = {{}};
+    this.items.forEach((item, index) => {{
+      if (index > this.limit && item % factor === 0) {{
+        results[index] = Array.from({{ length: item }}, (_, x) => x * factor).filter(x => x % 3);
+      }} else if (typeof item === "string") {{
+        results[index] = `${{item.trim().toLowerCase()}}_{i}`;
+      }}
+    }});
+    return Object.entries(results).sort((a, b) => a[0] - b[0]);
+  }}
+}}
+'''
+
+BASELINES = {
+    "python": lambda code: hashlib.sha256(normalize_python(code).encode("utf-8")).hexdigest(),
+    "javascript": lambda code: hashlib.sha256(normalize_javascript(code).encode("utf-8")).hexdigest(),
+}
+
+
+def measure(func, code, rounds):
+    """(mean seconds, peak traced bytes) of func(code)."""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(code)
+    seconds = (time.perf_counter() - start) / rounds
+    tracemalloc.start()
+    func(code)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak
+
+
+if __name__ == "__main__":
+    units = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    sources = {
+        "python": "".join(PYTHON_UNIT.format(i=i) for i in range(units)),
+        "javascript": "".join(JAVASCRIPT_UNIT.format(i=i) for i in range(units)),
+    }
+    for language, code in sources.items():
+        baseline_s, baseline_peak = measure(BASELINES[language], code, rounds)
+        streaming_s, streaming_peak = measure(lambda c: get_semantic_hash(c, language), code, rounds)
+        print(f"{language:<10} {len(code) / 1024:7.0f} KiB  "
+              f"normalize+hash={baseline_s * 1000:8.1f} ms / {baseline_peak / 2**20:6.1f} MiB  "
+              f"streaming={streaming_s * 1000:8.1f} ms / {streaming_peak / 2**20:6.1f} MiB  "
+              f"speedup={baseline_s / streaming_s:4.1f}x")
@@ -0,0 +1,43 @@
+# Latency benchmark: subprocess analyzers vs. the warm in-process pool.
+# Reports the mean per-snippet latency of pylint, flake8 and bandit both ways.
+#
+#   python -m scripts.bench_static_analysis [rounds]
+import sys
+import time
+from tools import analysis_pool
+from tools.static_analysis import _run_pylint_subprocess
+from tools.metrics import _run_tool_with_stdin
+
+SNIPPETS = [
+    "import os\ndef check_path( path):\n    if os.path.exists(path)==True:\n        print('path exists')\n    else:\n        return False\n",
+    "def calculate_average(numbers):\n    total = 0\n    for n in numbers:\n        total += n\n    return total / len(numbers)\n",
+    "import subprocess\ndef run(cmd):\n    return subprocess.call(cmd, shell=True)\n",
+]
+
+TOOLS = {
+    "pylint": (_run_pylint_subprocess, analysis_pool.pylint_messages),
+    "flake8": (
+        lambda code: _run_tool_with_stdin(['flake8', '--stdin-display-name', 'style_check', '-'], code),
+        analysis_pool.flake8_issue_count,
+    ),
+    "bandit": (
+        lambda code: _run_tool_with_stdin(['bandit', '-f', 'json', '-'], code),
+        analysis_pool.bandit_issue_count,
+    ),
+}
+
+def mean_latency(func, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for code in SNIPPETS:
+            func(code)
+    return (time.perf_counter() - start) / (rounds * len(SNIPPETS))
+
+if __name__ == "__main__":
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    analysis_pool.start_pool()
+    for name, (subprocess_func, pool_func) in TOOLS.items():
+        analysis_pool.run(pool_func, SNIPPETS[0])  # warm-up
+        subprocess_ms = mean_latency(subprocess_func, rounds) * 1000
+        pool_ms = mean_latency(lambda code: analysis_pool.run(pool_func, code), rounds) * 1000
+        print(f"{name:<7} subprocess={subprocess_ms:8.1f} ms  warm pool={pool_ms:8.1f} ms  speedup={subprocess_ms / pool_ms:5.1f}x")
@@ -0,0 +1,48 @@
+# Startup-time regression check for the API tier.
+# Imports service.main in a fresh interpreter and fails if the import is slower
+# than the budget or if any ML module (torch, transformers, the agent) got loaded.
+#
+#   python -m scripts.check_api_startup [max_seconds]
+import json
+import os
+import subprocess
+import sys
+
+FORBIDDEN_MODULES = ["torch", "transformers", "peft", "trl", "agent.agent", "model.base_model"]
+
+PROBE = f"""
+import json, sys, time
+start = time.perf_counter()
+import service.main
+elapsed = time.perf_counter() - start
+loaded = [name for name in {FORBIDDEN_MODULES!r} if name in sys.modules]
+print(json.dumps({{"seconds": elapsed, "forbidden": loaded}}))
+"""
+
+def main(max_seconds):
+    env = dict(os.environ)
+    # The webhook router refuses to import without these; any value will do for the check
+    env.setdefault("GITHUB_WEBHOOK_SECRET", "startup-check")
+    env.setdefault("GITHUB_TOKEN", "startup-check")
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        capture_output=True, text=True, check=False, env=env,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    if result.returncode != 0:
+        print(f"FAIL: importing service.main raised an error:\n{result.stderr}")
+        return 1
+
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    print(f"service.main imported in {report['seconds']:.3f}s (budget {max_seconds:.3f}s)")
+    if report["forbidden"]:
+        print(f"FAIL: the API process imported ML modules: {', '.join(report['forbidden'])}")
+        return 1
+    if report["seconds"] > max_seconds:
+        print("FAIL: API startup is slower than the budget")
+        return 1
+    print("OK")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(float(sys.argv[1]) if len(sys.argv) > 1 else 1.0))
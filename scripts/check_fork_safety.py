@@ -0,0 +1,81 @@
+# Checks that per-process resources keep working in forked RQ work horses.
+# WORKER_MODE=fork builds them in the worker process and forks a work horse
+# per job; threads do not survive fork(), so each must be rebuilt in the child.
+#
+#   python -m scripts.check_fork_safety
+import os
+import sys
+from model.inference_engine import InferenceEngine
+from tools import analysis_pool
+
+CHILD_TIMEOUT_SECONDS = 10
+
+
+class StubTokenizer:
+    eos_token_id = 0
+
+    def __call__(self, text, add_special_tokens=True, truncation=False):
+        return {"input_ids": [len(word) for word in text.split()]}
+
+
+class StubEngine(InferenceEngine):
+    """Echoes prompts instead of running a model."""
+
+    def _generate_batch(self, batch):
+        for request in batch:
+            request.future.set_result(request.prompt.upper())
+
+    def _generate_single(self, request):
+        self._generate_batch([request])
+
+
+def check_inference_engine():
+    engine = StubEngine(model=None, tokenizer=StubTokenizer())
+    return engine.submit("parent").result(timeout=CHILD_TIMEOUT_SECONDS) == "PARENT", \
+        lambda: engine.submit("child").result(timeout=CHILD_TIMEOUT_SECONDS) == "CHILD"
+
+
+def check_analysis_pool():
+    code = "import os\nx=1\n"
+    analysis_pool.start_pool()
+    parent_count = analysis_pool.run(analysis_pool.flake8_issue_count, code, timeout=CHILD_TIMEOUT_SECONDS)
+
+    def child():
+        try:
+            return analysis_pool.run(analysis_pool.flake8_issue_count, code, timeout=CHILD_TIMEOUT_SECONDS) == parent_count
+        finally:
+            analysis_pool.stop_pool()
+
+    return parent_count > 0, child
+
+
+def in_forked_child(func):
+    """Runs `func` in a forked child the way an RQ work horse would; True if it returned True."""
+    pid = os.fork()
+    if pid == 0:
+        try:
+            ok = func()
+        except Exception as e:  # Including the TimeoutError of a request no engine thread serves
+            print(f"  child failed: {e!r}")
+            ok = False
+        os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+    return os.WEXITSTATUS(status) == 0
+
+
+CHECKS = {
+    "inference_engine": check_inference_engine,
+    "analysis_pool": check_analysis_pool,
+}
+
+
+if __name__ == "__main__":
+    failed = False
+    for name, check in CHECKS.items():
+        parent_ok, child_check = check()
+        child_ok = in_forked_child(child_check)
+        print(f"{name:<17} parent={'ok' if parent_ok else 'FAIL'} forked child={'ok' if child_ok else 'FAIL'}")
+        failed |= not (parent_ok and child_ok)
+    analysis_pool.stop_pool()
+    print("FAIL" if failed else "OK")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,116 @@
+# Exercises the async GitHub client against a local stand-in GitHub server.
+# The stand-in serves a paginated PR files list and slow file contents with
+# ETags, and rate limits once, so pagination, bounded concurrency, conditional
+# requests and backoff can be checked without touching api.github.com.
+#
+#   python -m scripts.check_github_client [num_files]
+import asyncio
+import json
+import socket
+import sys
+import threading
+import time
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from config.settings import GITHUB_CLIENT_CONFIG
+from service.github_client import get_async_client
+
+CONTENT_LATENCY_SECONDS = 0.05
+PAGE_SIZE_LIMIT = 100
+
+
+def build_stand_in(num_files):
+    app = FastAPI()
+    state = {"in_flight": 0, "max_in_flight": 0, "rate_limited_once": False}
+
+    def etag_response(request, etag, **kwargs):
+        if request.headers.get("If-None-Match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        response = Response(**kwargs)
+        response.headers["ETag"] = etag
+        return response
+
+    @app.get("/repos/o/r/pulls/1/files")
+    async def files(request: Request, per_page: int = 30, page: int = 1):
+        per_page = min(per_page, PAGE_SIZE_LIMIT)
+        base = str(request.base_url).rstrip("/")
+        start = (page - 1) * per_page
+        items = [
+            {"filename": f"pkg/module_{i}.py", "status": "modified",
+             "contents_url": f"{base}/repos/o/r/contents/module_{i}.py", "patch": "@@ -1 +1 @@\n-x = 0\n+x = 1"}
+            for i in range(start, min(start + per_page, num_files))
+        ]
+        headers = {}
+        if start + per_page < num_files:
+            headers["Link"] = f'<{base}/repos/o/r/pulls/1/files?per_page={per_page}&page={page + 1}>; rel="next"'
+        response = etag_response(request, f'"files-{page}"', content=json.dumps(items), media_type="application/json")
+        response.headers.update(headers)
+        return response
+
+    @app.get("/repos/o/r/contents/{name}")
+    async def contents(request: Request, name: str):
+        if name == "module_0.py" and not state["rate_limited_once"]:
+            state["rate_limited_once"] = True
+            return Response(status_code=403, headers={
+                "X-RateLimit-Remaining": "0", "X-RateLimit-Reset": str(int(time.time()) + 1)})
+        state["in_flight"] += 1
+        state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+        try:
+            await asyncio.sleep(CONTENT_LATENCY_SECONDS)
+        finally:
+            state["in_flight"] -= 1
+        return etag_response(request, f'"{name}"', content=f"# {name}\nx = 1\n", media_type="text/plain")
+
+    return app, state
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def fetch_all(pr_url):
+    client = get_async_client()
+    start = time.perf_counter()
+    files = await client.get_pr_files(pr_url)
+    contents = await client.get_file_contents([f["contents_url"] for f in files])
+    return files, contents, time.perf_counter() - start, dict(client.stats)
+
+
+def main(num_files):
+    app, state = build_stand_in(num_files)
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    pr_url = f"http://127.0.0.1:{port}/repos/o/r/pulls/1"
+
+    async def run():
+        first = await fetch_all(pr_url)
+        second = await fetch_all(pr_url)
+        return first, second
+
+    (files, contents, cold_seconds, cold_stats), (_, _, warm_seconds, warm_stats) = asyncio.run(run())
+    serial_estimate = num_files * CONTENT_LATENCY_SECONDS
+    max_concurrency = GITHUB_CLIENT_CONFIG["max_concurrency"]
+    print(f"files: {len(files)} (expected {num_files}), contents: {len(contents)}")
+    print(f"cold fetch: {cold_seconds:.2f}s (serial would be >= {serial_estimate:.2f}s), "
+          f"max in flight {state['max_in_flight']} (limit {max_concurrency}), stats {cold_stats}")
+    print(f"warm fetch: {warm_seconds:.2f}s, 304s: {warm_stats['not_modified'] - cold_stats['not_modified']}")
+    server.should_exit = True
+
+    ok = (
+        len(files) == num_files
+        and all(c.startswith("# module_") for c in contents)
+        and 1 < state["max_in_flight"] <= max_concurrency
+        and cold_stats["rate_limited"] == 1
+        and warm_stats["not_modified"] - cold_stats["not_modified"] == num_files + (num_files + 99) // 100
+    )
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 250))
@@ -0,0 +1,57 @@
+# Queue-depth admission control for interactive reviews.
+# A review request is only worth accepting if a worker can get to it soon.
+# Workers count the jobs they take per lane in per-second Redis buckets; the
+# API divides the lane's backlog by that observed service rate to estimate
+# how long a new job would wait, and rejects it with a Retry-After when the
+# wait would exceed the configured bound. The API side uses the asyncio client,
+# so admission never blocks the event loop.
+import math
+import time
+import redis
+from config.settings import ADMISSION_CONFIG
+from service.task_queue import conn as redis_conn, async_conn, lane_depth
+
+
+def _bucket_key(lane: str, second: int) -> str:
+    return f"lane_dequeued:{lane}:{second}"
+
+
+def record_dequeue(lane: str):
+    """Called by workers for every job they take from `lane`."""
+    key = _bucket_key(lane, int(time.time()))
+    pipe = redis_conn.pipeline()
+    pipe.incr(key)
+    pipe.expire(key, ADMISSION_CONFIG["rate_window_seconds"] + 60)
+    pipe.execute()
+
+
+async def service_rate(lane: str) -> float:
+    """Jobs per second taken from `lane` by all workers over the rate window."""
+    window = ADMISSION_CONFIG["rate_window_seconds"]
+    now = int(time.time())
+    counts = await async_conn.mget([_bucket_key(lane, second) for second in range(now - window, now)])
+    return sum(int(count) for count in counts if count) / window
+
+
+async def retry_after(lane: str):
+    """
+    Seconds a client should wait before submitting to `lane` again, or None
+    if the job can be admitted now. Fails open if Redis cannot be read.
+    """
+    try:
+        depth = await lane_depth(lane)
+        rate = await service_rate(lane)
+    except redis.RedisError:
+        return None
+    max_wait = ADMISSION_CONFIG["max_queue_wait_seconds"]
+    if rate > 0:
+        expected_wait = depth / rate
+        if expected_wait <= max_wait and depth < ADMISSION_CONFIG["max_queue_depth"]:
+            return None
+        # Time until the backlog has drained to what can be served within max_wait
+        excess = max(depth - rate * max_wait, depth - ADMISSION_CONFIG["max_queue_depth"] + 1, 1)
+        return max(1, math.ceil(excess / rate))
+    # No recent throughput (workers down or just started): only the depth bound applies
+    if depth < ADMISSION_CONFIG["max_queue_depth"]:
+        return None
+    return ADMISSION_CONFIG["default_retry_after_seconds"]
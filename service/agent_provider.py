@@ -0,0 +1,45 @@
+# Process-wide CodeReviewAgent instance for RQ workers.
+# Loading the model takes tens of seconds and a full copy of the weights, so
+# it must happen once per worker process instead of once per job.
+import logging
+import threading
+import time
+from agent.agent import CodeReviewAgent
+from service import worker_stats
+
+logger = logging.getLogger(__name__)
+
+_agent = None
+_agent_lock = threading.Lock()
+
+
+def is_agent_loaded() -> bool:
+    """True if this process (or the parent it was forked from) already holds the agent."""
+    return _agent is not None
+
+
+def get_agent() -> CodeReviewAgent:
+    """Returns the shared agent, loading the model on first use."""
+    global _agent
+    if _agent is None:
+        with _agent_lock:
+            if _agent is None:
+                start = time.perf_counter()
+                _agent = CodeReviewAgent()
+                load_seconds = time.perf_counter() - start
+                logger.info(f"Loaded CodeReviewAgent in {load_seconds:.1f}s.")
+                worker_stats.incr("model_loads")
+                worker_stats.incr("model_load_seconds_total", load_seconds)
+                worker_stats.set_value("model_load_seconds_last", load_seconds)
+    return _agent
+
+
+def get_agent_for_job() -> CodeReviewAgent:
+    """
+    Returns the shared agent and records whether the calling job found it
+    already loaded (warm) or had to wait for the model to load (cold).
+    """
+    warm = is_agent_loaded()
+    agent = get_agent()
+    worker_stats.incr("warm_jobs" if warm else "cold_jobs")
+    return agent
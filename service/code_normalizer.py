@@ -1,8 +1,21 @@
 # This file contains the logic for semantic normalization.
+# get_semantic_hash walks the parsed tree once and streams a canonical token
+# sequence (node types, literals, placeholder identifiers) straight into an
+# incremental SHA-256, without building a normalized copy or string of the
+# whole tree. normalize_python/normalize_javascript produce readable
+# normalized text and remain for near-duplicate shingling.
 import ast
 import esprima # For JavaScript
 import hashlib
 
+# Identifier fields replaced by numbered placeholders, as PythonNormalizer does
+PYTHON_RENAMED_FIELDS = {ast.Name: "id", ast.FunctionDef: "name", ast.AsyncFunctionDef: "name", ast.arg: "arg"}
+# Fields that carry no semantics (load/store context, comments, u-prefix)
+PYTHON_SKIPPED_FIELDS = frozenset(("ctx", "type_comment", "kind"))
+# Fields esprima only sets when asked for positions
+JS_SKIPPED_FIELDS = frozenset(("type", "loc", "range"))
+HASH_BATCH_TOKENS = 1024
+
 class PythonNormalizer(ast.NodeTransformer):
     """
     Normalizes a Python AST by replacing names of variables, functions,
@@ -71,22 +84,115 @@ def normalize_javascript(code: str) -> str:
         
         normalized_tree = remove_names(tree.toDict())
         return str(normalized_tree)
-    except esprima.error.Error:
+    except esprima.Error:
         return code
 
 
-def get_semantic_hash(code: str, language: str) -> str:
+def _python_tokens(tree):
     """
-    Generates a hash based on the semantic structure of the code,
-    not its superficial text.
+    Canonical tokens of a Python AST in pre-order. Every node type has a fixed
+    list of fields, so node type names plus "[" / "]" around lists make the
+    sequence unambiguous. Names of variables, functions and arguments become
+    VAR_n in order of first appearance.
     """
-    normalized_code = ""
-    if language == "python":
-        normalized_code = normalize_python(code)
-    elif language == "javascript":
-        normalized_code = normalize_javascript(code)
+    names = {}
+    stack = [tree]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            yield item
+        elif isinstance(item, tuple):
+            # An identifier to replace, numbered when reached so numbering follows the walk
+            if item[0] not in names:
+                names[item[0]] = f"VAR_{len(names)}"
+            yield names[item[0]]
+        else:
+            yield type(item).__name__
+            renamed = PYTHON_RENAMED_FIELDS.get(type(item))
+            children = []
+            for field, value in ast.iter_fields(item):
+                if field in PYTHON_SKIPPED_FIELDS:
+                    continue
+                if field == renamed:
+                    children.append((value,))
+                elif isinstance(value, list):
+                    children.append("[")
+                    children.extend(v if isinstance(v, ast.AST) else repr(v) for v in value)
+                    children.append("]")
+                else:
+                    children.append(value if isinstance(value, ast.AST) else repr(value))
+            stack.extend(reversed(children))
+
+
+def _javascript_tokens(tree):
+    """
+    Canonical tokens of an esprima tree in pre-order, read straight from the
+    node objects instead of a toDict() copy. Field names are included, and
+    every "name" becomes IDENTIFIER as in normalize_javascript.
+    """
+    stack = [tree]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            yield item
+            continue
+        fields = vars(item)
+        yield fields.get("type") or type(item).__name__
+        children = []
+        for field, value in fields.items():
+            if field in JS_SKIPPED_FIELDS:
+                continue
+            children.append(field)
+            if field == "name":
+                children.append("IDENTIFIER")
+            elif isinstance(value, list):
+                children.append("[")
+                children.extend(v if isinstance(v, esprima.objects.Object) else repr(v) for v in value)
+                children.append("]")
+            elif isinstance(value, esprima.objects.Object):
+                children.append(value)
+            elif value is None or isinstance(value, (str, int, float, bool)):
+                children.append(repr(value))
+            else:
+                children.append(type(value).__name__)  # e.g. the compiled pattern of a regex literal; `raw` has its text
+        stack.extend(reversed(children))
+
+
+def iter_canonical_tokens(code: str, language: str):
+    """
+    Yields the canonical token stream of `code` that get_semantic_hash
+    digests. Code that cannot be parsed (or an unsupported language) yields
+    the original code as a single token.
+    """
+    tokens = None
+    try:
+        if language == "python":
+            tokens = _python_tokens(ast.parse(code))
+        elif language == "javascript":
+            tokens = _javascript_tokens(esprima.parse(code))
+    except (SyntaxError, ValueError, esprima.Error):
+        pass
+    if tokens is None:
+        yield code
     else:
-        # Fallback for unsupported languages
-        normalized_code = code
+        yield from tokens
+
 
-    return hashlib.sha256(normalized_code.encode('utf-8')).hexdigest()
+def get_semantic_hash(code: str, language: str) -> str:
+    """
+    Generates a hash based on the semantic structure of the code,
+    not its superficial text. Tokens are fed to the hasher in batches
+    as the tree is walked.
+    """
+    digest = hashlib.sha256()
+    batch = []
+    for token in iter_canonical_tokens(code, language):
+        batch.append(token)
+        if len(batch) >= HASH_BATCH_TOKENS:
+            batch.append("")
+            digest.update("\0".join(batch).encode("utf-8"))
+            batch.clear()
+    if batch:
+        batch.append("")
+        digest.update("\0".join(batch).encode("utf-8"))
+    return digest.hexdigest()
@@ -0,0 +1,206 @@
+# This file extracts the code units (functions, classes) touched by a diff.
+# Pull request reviews use it to send the model only the definitions that
+# enclose changed hunks instead of the whole file.
+import ast
+import re
+import textwrap
+from dataclasses import dataclass
+import esprima
+
+HUNK_HEADER = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)(?:,\d+)? @@")
+
+JS_DEFINITIONS = ("FunctionDeclaration", "ClassDeclaration", "MethodDefinition")
+JS_FUNCTION_VALUES = ("FunctionExpression", "ArrowFunctionExpression", "ClassExpression")
+
+
+@dataclass(frozen=True)
+class CodeUnit:
+    name: str        # e.g. "Parser.parse", or "<module>" for changed top-level statements
+    kind: str        # "function", "class" or "module"
+    start_line: int  # 1-based, inclusive, in the new version of the file
+    end_line: int
+    code: str        # Dedented source of the unit
+
+
+def changed_lines(patch: str) -> set:
+    """
+    Line numbers in the new file touched by a unified diff `patch` (the
+    `patch` field of GitHub's PR files API). Added lines count, and so does
+    the line following a removal, so pure deletions still map to their unit.
+    """
+    lines = set()
+    new_line = None
+    for row in patch.splitlines():
+        header = HUNK_HEADER.match(row)
+        if header:
+            new_line = int(header.group(1))
+        elif new_line is None or row.startswith("\\"):
+            continue  # Preamble, or "\ No newline at end of file"
+        elif row.startswith("+"):
+            lines.add(new_line)
+            new_line += 1
+        elif row.startswith("-"):
+            lines.add(max(new_line, 1))
+        else:
+            new_line += 1
+    return lines
+
+
+def _python_spans(code):
+    """(start, end, name, kind) of every definition, plus the top-level statement spans."""
+    tree = ast.parse(code)
+    definitions = []
+
+    def visit(node, scope):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                start = min([child.lineno] + [d.lineno for d in child.decorator_list])
+                kind = "class" if isinstance(child, ast.ClassDef) else "function"
+                name = ".".join(scope + [child.name])
+                definitions.append((start, child.end_lineno, name, kind))
+                visit(child, scope + [child.name])
+            else:
+                visit(child, scope)
+
+    visit(tree, [])
+    statements = [
+        (min([stmt.lineno] + [d.lineno for d in getattr(stmt, "decorator_list", [])]), stmt.end_lineno)
+        for stmt in tree.body
+    ]
+    return definitions, statements
+
+
+def _js_name(node):
+    if node.type == "MethodDefinition":
+        return getattr(node.key, "name", None) or getattr(node.key, "value", None) or "<method>"
+    if node.type == "VariableDeclaration":
+        return ", ".join(getattr(d.id, "name", "<pattern>") for d in node.declarations)
+    return getattr(node.id, "name", None) if node.id else "<anonymous>"
+
+
+def _js_spans(code):
+    try:
+        tree = esprima.parseModule(code, {"loc": True})
+    except esprima.Error:
+        tree = esprima.parseScript(code, {"loc": True})
+    definitions = []
+
+    def visit(node, scope):
+        name = None
+        if node.type in JS_DEFINITIONS:
+            name = _js_name(node)
+        elif node.type == "VariableDeclaration" and any(
+            d.init is not None and d.init.type in JS_FUNCTION_VALUES for d in node.declarations
+        ):
+            name = _js_name(node)
+        if name is not None:
+            kind = "class" if "Class" in node.type else "function"
+            definitions.append((node.loc.start.line, node.loc.end.line, ".".join(scope + [name]), kind))
+            scope = scope + [name]
+        for value in vars(node).values():
+            children = value if isinstance(value, list) else [value]
+            for child in children:
+                if isinstance(child, esprima.nodes.Node):
+                    visit(child, scope)
+
+    visit(tree, [])
+    statements = [(stmt.loc.start.line, stmt.loc.end.line) for stmt in tree.body]
+    return definitions, statements
+
+
+def _source(code_lines, start, end):
+    return textwrap.dedent("\n".join(code_lines[start - 1:end])).strip("\n") + "\n"
+
+
+def _spans(code, language):
+    if language == "python":
+        return _python_spans(code)
+    if language == "javascript":
+        return _js_spans(code)
+    raise ValueError(f"Unsupported language: {language}")
+
+
+def split_units(code: str, language: str):
+    """
+    Splits a whole file into its top-level functions and classes, plus one
+    "<module>" unit with the remaining top-level statements (if any).
+    Returns None when the file cannot be parsed.
+    """
+    try:
+        definitions, statements = _spans(code, language)
+    except (SyntaxError, ValueError, esprima.Error):
+        return None
+
+    code_lines = code.splitlines()
+    units = []
+    module_spans = []
+    for start, end in statements:
+        # A statement that is exactly one definition (possibly exported) is its own unit
+        matches = [d for d in definitions if d[0] == start and d[1] == end]
+        if matches:
+            _, _, name, kind = min(matches, key=lambda d: d[2].count("."))
+            units.append(CodeUnit(name=name, kind=kind, start_line=start, end_line=end,
+                                  code=_source(code_lines, start, end)))
+        else:
+            module_spans.append((start, end))
+    if module_spans:
+        units.append(CodeUnit(
+            name="<module>",
+            kind="module",
+            start_line=module_spans[0][0],
+            end_line=module_spans[-1][1],
+            code="".join(_source(code_lines, start, end) for start, end in module_spans),
+        ))
+    return units
+
+
+def extract_changed_units(code: str, language: str, patch: str):
+    """
+    The functions and classes of `code` (the new version of a file) that
+    enclose the hunks of `patch`. A change inside a function yields its
+    outermost enclosing function (so closures keep their context) and a
+    change in a class body outside any method yields the class. Changed
+    top-level statements outside any definition are gathered into one
+    "<module>" unit.
+
+    Returns None when the file cannot be parsed; callers then review the
+    whole file.
+    """
+    lines = changed_lines(patch)
+    try:
+        definitions, statements = _spans(code, language)
+    except (SyntaxError, ValueError, esprima.Error):
+        return None
+
+    selected = set()
+    module_statements = set()
+    for line in lines:
+        enclosing = [d for d in definitions if d[0] <= line <= d[1]]
+        functions = [d for d in enclosing if d[3] == "function"]
+        if functions:
+            selected.add(min(functions))  # Outermost: the earliest start
+        elif enclosing:
+            selected.add(max(enclosing))  # Innermost class: the latest start
+        else:
+            module_statements.update(s for s in statements if s[0] <= line <= s[1])
+
+    # Drop units nested inside another selected unit, which already covers them
+    selected = [
+        d for d in selected
+        if not any(o != d and o[0] <= d[0] and d[1] <= o[1] for o in selected)
+    ]
+    code_lines = code.splitlines()
+    units = [
+        CodeUnit(name=name, kind=kind, start_line=start, end_line=end, code=_source(code_lines, start, end))
+        for start, end, name, kind in sorted(selected)
+    ]
+    if module_statements:
+        spans = sorted(module_statements)
+        units.append(CodeUnit(
+            name="<module>",
+            kind="module",
+            start_line=spans[0][0],
+            end_line=spans[-1][1],
+            code="".join(_source(code_lines, start, end) for start, end in spans),
+        ))
+    return units
@@ -1,6 +1,11 @@
 # This file handles all communication with the GitHub API.
+import asyncio
+import json
+import time
+from collections import OrderedDict
 import httpx
 import os
+from config.settings import GITHUB_CLIENT_CONFIG
 
 # It's crucial to load the token from environment variables
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
@@ -32,4 +37,145 @@ def post_comment(comment_url: str, body: str):
             return response.json()
     except httpx.HTTPStatusError as e:
         print(f"Error posting comment to GitHub: {e.response.status_code} - {e.response.text}")
-        raise
\ No newline at end of file
+        raise
+
+class GitHubRateLimitError(Exception):
+    """Raised when GitHub keeps rate limiting beyond the configured backoff."""
+
+
+# Shared by all clients of the process: workers create a client per asyncio.run, and
+# ETag revalidation should keep working across those runs
+_etag_cache = OrderedDict()
+
+
+class AsyncGitHubClient:
+    """
+    Pooled async client for reading from the GitHub API. Requests share one
+    connection pool and at most `max_concurrency` are in flight. GET responses
+    are cached with their ETag and revalidated with If-None-Match (a 304 does
+    not count against the rate limit). `Link` pagination is followed, and rate
+    limiting (X-RateLimit-* / Retry-After) and 5xx responses are retried with backoff.
+
+    The client binds to the running event loop; use `get_async_client()`.
+    """
+
+    def __init__(self, token=GITHUB_TOKEN, config=GITHUB_CLIENT_CONFIG):
+        self.config = config
+        headers = {"Accept": "application/vnd.github.v3+json"}
+        if token:
+            headers["Authorization"] = f"token {token}"
+        self._client = httpx.AsyncClient(
+            headers=headers,
+            timeout=config["timeout_seconds"],
+            limits=httpx.Limits(max_connections=config["max_connections"],
+                                max_keepalive_connections=config["max_connections"]),
+        )
+        self._semaphore = asyncio.Semaphore(config["max_concurrency"])
+        self._etag_cache = _etag_cache
+        self._paused_until = 0.0  # Set when the rate limit is exhausted, so other requests wait too
+        self.stats = {"requests": 0, "not_modified": 0, "rate_limited": 0, "retries": 0}
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    def _rate_limit_delay(self, response):
+        """Seconds to wait before retrying a rate-limited response, or None if it is not one."""
+        if response.status_code not in (403, 429):
+            return None
+        if "Retry-After" in response.headers:
+            return float(response.headers["Retry-After"])
+        if response.headers.get("X-RateLimit-Remaining") == "0":
+            reset = float(response.headers.get("X-RateLimit-Reset", time.time()))
+            return max(0.0, reset - time.time()) + 1
+        return None
+
+    async def _get(self, url, accept=None):
+        """GET with ETag revalidation and retries; returns (headers, body text)."""
+        cache_key = (url, accept)
+        for attempt in range(self.config["max_retries"] + 1):
+            pause = self._paused_until - time.time()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            headers = {"Accept": accept} if accept else {}
+            cached = self._etag_cache.get(cache_key)
+            if cached:
+                headers["If-None-Match"] = cached[0]
+            async with self._semaphore:
+                response = await self._client.get(url, headers=headers)
+            self.stats["requests"] += 1
+
+            if response.status_code == 304 and cached:
+                self.stats["not_modified"] += 1
+                self._etag_cache.move_to_end(cache_key)
+                return cached[1], cached[2]
+
+            delay = self._rate_limit_delay(response)
+            if delay is None and response.status_code >= 500:
+                delay = min(2 ** attempt, self.config["max_backoff_seconds"])
+            if delay is not None:
+                if response.status_code < 500:
+                    self.stats["rate_limited"] += 1
+                if attempt == self.config["max_retries"] or delay > self.config["max_backoff_seconds"]:
+                    if response.status_code < 500:
+                        raise GitHubRateLimitError(f"GitHub rate limit hit for {url}; retry in {delay:.0f}s")
+                    response.raise_for_status()
+                self.stats["retries"] += 1
+                self._paused_until = max(self._paused_until, time.time() + delay)
+                continue
+
+            response.raise_for_status()
+            if response.headers.get("X-RateLimit-Remaining") == "0":
+                # Quota used up: hold further requests until the reset instead of collecting 403s
+                reset = float(response.headers.get("X-RateLimit-Reset", time.time()))
+                if reset - time.time() <= self.config["max_backoff_seconds"]:
+                    self._paused_until = max(self._paused_until, reset)
+            if "ETag" in response.headers:
+                self._etag_cache[cache_key] = (response.headers["ETag"], response.headers, response.text)
+                self._etag_cache.move_to_end(cache_key)
+                while len(self._etag_cache) > self.config["etag_cache_entries"]:
+                    self._etag_cache.popitem(last=False)
+            return response.headers, response.text
+
+    async def get_paginated(self, url, per_page=100):
+        """All items of a list endpoint, following the `Link: rel="next"` pages."""
+        items = []
+        url = str(httpx.URL(url).copy_merge_params({"per_page": per_page}))
+        while url:
+            headers, text = await self._get(url)
+            items.extend(json.loads(text))
+            links = httpx.Response(200, headers=headers).links
+            url = links.get("next", {}).get("url")
+        return items
+
+    async def get_pr_files(self, pr_url):
+        """Every changed file of a pull request (the API pages them 100 at a time)."""
+        return await self.get_paginated(pr_url + "/files")
+
+    async def get_file_content(self, contents_url):
+        _, text = await self._get(contents_url, accept="application/vnd.github.v3.raw")
+        return text
+
+    async def get_file_contents(self, contents_urls):
+        """Fetches several files concurrently (bounded by `max_concurrency`)."""
+        return await asyncio.gather(*(self.get_file_content(url) for url in contents_urls))
+
+
+_async_clients = {}
+
+
+def get_async_client() -> AsyncGitHubClient:
+    """The shared client of the running event loop (created on first use)."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        # Drop clients of loops that have been closed (e.g. finished asyncio.run calls)
+        for old_loop in [old for old in _async_clients if old.is_closed()]:
+            del _async_clients[old_loop]
+        client = _async_clients[loop] = AsyncGitHubClient()
+    return client
+
+
+async def close_async_client():
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
@@ -1,16 +1,27 @@
 from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import StreamingResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from slowapi import Limiter, _rate_limit_exceeded_handler
+from slowapi import Limiter
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from prometheus_fastapi_instrumentator import Instrumentator
-from agent.agent import CodeReviewAgent
+from prometheus_client import REGISTRY, Histogram, Counter
 from service.webhook_handler import router as webhook_router
-from service.task_queue import queue
+from service.task_queue import enqueue, conn as redis_conn
+from service.review_results import wait_for_result
+from service.review_stream import iter_events
+from service.admission import retry_after
+from config.settings import LONG_POLL_MAX_SECONDS, STREAM_IDLE_TIMEOUT_SECONDS, RATE_LIMIT_CONFIG
+from rq.job import Job
+from rq.exceptions import NoSuchJobError
+from service.worker_stats import WorkerStatsCollector
 import uvicorn
+import json
+import time
 
+# The API tier only enqueues jobs: it must never import the agent, torch or transformers.
+# Jobs are referenced by dotted path so that only RQ workers load a model.
 app = FastAPI(title="Code Review Agent API")
-agent = CodeReviewAgent()
 
 # CORS Middleware Setup
 app.add_middleware(
@@ -22,12 +33,53 @@ app.add_middleware(
 )
 
 # Rate Limiting
-limiter = Limiter(key_func=get_remote_address)
+# Counters live in Redis so limits hold across API processes; if Redis is unreachable
+# each process falls back to its own in-memory counters rather than failing requests.
+limiter = Limiter(
+    key_func=get_remote_address,
+    storage_uri=RATE_LIMIT_CONFIG["storage_uri"],
+    in_memory_fallback_enabled=True,
+)
 app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+
+def _global_key(request: Request) -> str:
+    # One bucket for all clients, for limits on the service's total intake
+    return "global"
+
+async def _rate_limit_exceeded(request: Request, exc: RateLimitExceeded):
+    # The limit's window length is an upper bound on how long until it resets
+    return JSONResponse(
+        status_code=429,
+        content={"error": f"Rate limit exceeded: {exc.detail}"},
+        headers={"Retry-After": str(exc.limit.limit.get_expiry())},
+    )
+
+app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded)
 
 # Prometheus Monitoring
 Instrumentator().instrument(app).expose(app)
+REGISTRY.register(WorkerStatsCollector())  # Model-load time and warm/cold job counts from the workers
+TIME_TO_FIRST_TOKEN = Histogram(
+    "code_review_time_to_first_token_seconds",
+    "Time from a /review/stream request to the first generated token sent to the client.",
+    buckets=(0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300),
+)
+ADMISSION_REJECTIONS = Counter(
+    "code_review_admission_rejections_total",
+    "Review submissions rejected because the queue could not serve them in time.",
+    ["lane"],
+)
+
+async def _admit(lane: str):
+    """Sheds load early: rejects with 429 if the lane's backlog would make the job wait too long."""
+    wait = await retry_after(lane)
+    if wait is not None:
+        ADMISSION_REJECTIONS.labels(lane=lane).inc()
+        raise HTTPException(
+            status_code=429,
+            detail="The review queue is full, please retry later.",
+            headers={"Retry-After": str(wait)},
+        )
 
 @app.get("/health", summary="Health Check")
 @limiter.limit("10/minute")
@@ -36,7 +88,8 @@ async def health_check(request: Request):
     return {"status": "healthy"}
 
 @app.post("/review", summary="Submit Code for Review")
-@limiter.limit("5/minute")
+@limiter.limit(RATE_LIMIT_CONFIG["review_per_client"])
+@limiter.shared_limit(RATE_LIMIT_CONFIG["review_global"], scope="review_submissions", key_func=_global_key)
 async def review_code(request: Request):
     """Endpoint for manually submitting code for an asynchronous review."""
     data = await request.json()
@@ -45,11 +98,75 @@ async def review_code(request: Request):
     if not code or not language:
         raise HTTPException(status_code=400, detail="'code' and 'language' are required fields.")
     
-    job = queue.enqueue(agent.run, code, language)
+    await _admit("interactive")
+    # Interactive lane, queued per client so one busy client cannot starve the others
+    job = enqueue("interactive", get_remote_address(request), "service.worker_tasks.run_review", code, language)
     return {"job_id": job.id, "status": "queued"}
 
+@app.get("/review/{job_id}", summary="Get Review Status and Result")
+@limiter.limit("60/minute")
+async def get_review(request: Request, job_id: str, timeout: float = 0):
+    """
+    Returns the status of a review job and, once finished, its result with
+    per-stage timings. With `timeout` > 0 the request long-polls: it returns
+    as soon as the worker publishes the result, or after `timeout` seconds.
+    """
+    timeout = max(0.0, min(timeout, LONG_POLL_MAX_SECONDS))
+    payload = await wait_for_result(job_id, timeout)
+    if payload is not None:
+        return {"job_id": job_id, **payload}
+
+    try:
+        job = Job.fetch(job_id, connection=redis_conn)
+    except NoSuchJobError:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired job '{job_id}'.")
+    return {"job_id": job_id, "status": job.get_status(refresh=False)}
+
+def _format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _relay_review_events(job_id: str, requested_at: float = None):
+    """Relays a job's Redis stream as server-sent events, timing the first token if `requested_at` is given."""
+    yield _format_sse("queued", {"job_id": job_id})
+    async for event in iter_events(job_id, STREAM_IDLE_TIMEOUT_SECONDS):
+        kind = event["event"]
+        if kind == "token" and requested_at is not None:
+            TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - requested_at)
+            requested_at = None
+        if "payload" in event:
+            data = json.loads(event["payload"])
+        else:
+            data = {name: value for name, value in event.items() if name != "event"}
+        yield _format_sse(kind, data)
+
+@app.post("/review/stream", summary="Submit Code for Review and Stream the Response")
+@limiter.limit(RATE_LIMIT_CONFIG["review_per_client"])
+@limiter.shared_limit(RATE_LIMIT_CONFIG["review_global"], scope="review_submissions", key_func=_global_key)
+async def review_code_stream(request: Request):
+    """
+    Like /review, but the response is a server-sent-event stream that carries
+    the plan and the improved code token by token, followed by the final result.
+    """
+    requested_at = time.perf_counter()
+    data = await request.json()
+    code = data.get("code")
+    language = data.get("language")
+    if not code or not language:
+        raise HTTPException(status_code=400, detail="'code' and 'language' are required fields.")
+
+    await _admit("interactive")
+    job = enqueue("interactive", get_remote_address(request), "service.worker_tasks.run_review",
+                  code, language, stream=True)
+    return StreamingResponse(_relay_review_events(job.id, requested_at), media_type="text/event-stream")
+
+@app.get("/review/{job_id}/stream", summary="Stream a Review Job's Events")
+@limiter.limit("30/minute")
+async def stream_review(request: Request, job_id: str):
+    """Replays a streaming review job's events from the start and follows it until it finishes."""
+    return StreamingResponse(_relay_review_events(job_id), media_type="text/event-stream")
+
 # Include the GitHub webhook router
 app.include_router(webhook_router)
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    uvicorn.run("service.main:app", host="0.0.0.0", port=8000, reload=True)
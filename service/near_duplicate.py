@@ -0,0 +1,200 @@
+# Near-duplicate lookup for the review cache (MinHash + LSH).
+# The exact semantic hash misses code that differs only slightly (an added log
+# line, a changed literal, reordered imports). Each cached unit is also indexed
+# by a MinHash signature of its normalized token shingles; LSH bands narrow
+# the lookup to a few candidates whose estimated Jaccard similarity is then
+# checked against a threshold.
+import hashlib
+import logging
+import random
+import re
+import struct
+import threading
+import time
+import esprima
+import redis
+from config.settings import NEAR_DUPLICATE_CONFIG, REVIEW_CACHE_CONFIG
+from service.code_normalizer import normalize_python
+from service.task_queue import conn as redis_conn
+
+logger = logging.getLogger(__name__)
+
+MERSENNE_PRIME = (1 << 61) - 1
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+_random = random.Random(1)  # Fixed seed: signatures must agree across processes and restarts
+PERMUTATIONS = [
+    (_random.randrange(1, MERSENNE_PRIME), _random.randrange(0, MERSENNE_PRIME))
+    for _ in range(NEAR_DUPLICATE_CONFIG["num_perm"])
+]
+
+
+def _tokens(code: str, language: str):
+    """Tokens with identifiers normalized away, so renames do not count as differences."""
+    if language == "python":
+        return TOKEN_PATTERN.findall(normalize_python(code))
+    if language == "javascript":
+        try:
+            return ["ID" if t.type == "Identifier" else t.value for t in esprima.tokenize(code)]
+        except esprima.Error:
+            pass
+    return TOKEN_PATTERN.findall(code)
+
+
+def _stable_hash(text: str) -> int:
+    # hash() is salted per process, so use a keyed-free digest instead
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def signature(code: str, language: str):
+    """MinHash signature (a tuple of `num_perm` ints) of the code's token shingles."""
+    tokens = _tokens(code, language)
+    size = NEAR_DUPLICATE_CONFIG["shingle_size"]
+    shingles = {
+        _stable_hash(" ".join(tokens[i:i + size]))
+        for i in range(max(1, len(tokens) - size + 1))
+    }
+    return tuple(
+        min((a * shingle + b) % MERSENNE_PRIME for shingle in shingles)
+        for a, b in PERMUTATIONS
+    )
+
+
+def similarity(signature_a, signature_b) -> float:
+    """Estimated Jaccard similarity of the two shingle sets."""
+    return sum(x == y for x, y in zip(signature_a, signature_b)) / len(signature_a)
+
+
+def _band_keys(sig, language):
+    rows = len(sig) // NEAR_DUPLICATE_CONFIG["bands"]
+    for band in range(NEAR_DUPLICATE_CONFIG["bands"]):
+        chunk = struct.pack(f">{rows}Q", *sig[band * rows:(band + 1) * rows])
+        yield f"{language}:{band}:{hashlib.blake2b(chunk, digest_size=8).hexdigest()}"
+
+
+def _band_zset(band_key):
+    # Sorted sets; the plain sets of earlier versions lived under "near_dup:band:" and expire on their own
+    return f"near_dup:zband:{band_key}"
+
+
+class RedisIndex:
+    """
+    Index shared by all workers; entries expire with the review cache. Bands
+    are sorted sets scored by each member's expiry time, so members expire
+    one by one even in a busy band whose key is renewed by every add, and
+    each band keeps at most its `max_band_entries` newest members.
+    """
+
+    def add(self, entry_id, sig, band_keys):
+        ttl = REVIEW_CACHE_CONFIG["ttl_seconds"]
+        now = time.time()
+        pipe = redis_conn.pipeline()
+        pipe.set(f"near_dup:sig:{entry_id}", struct.pack(f">{len(sig)}Q", *sig), ex=ttl)
+        for band_key in band_keys:
+            key = _band_zset(band_key)
+            pipe.zadd(key, {entry_id: now + ttl})
+            pipe.zremrangebyscore(key, "-inf", now)
+            pipe.zremrangebyrank(key, 0, -NEAR_DUPLICATE_CONFIG["max_band_entries"] - 1)
+            pipe.expire(key, ttl)
+        pipe.execute()
+
+    def candidates(self, band_keys):
+        now = time.time()
+        pipe = redis_conn.pipeline()
+        for band_key in band_keys:
+            pipe.zrangebyscore(_band_zset(band_key), now, "+inf")
+        return {member.decode("utf-8") for members in pipe.execute() for member in members}
+
+    def remove(self, entry_id, band_keys):
+        pipe = redis_conn.pipeline()
+        pipe.delete(f"near_dup:sig:{entry_id}")
+        for band_key in band_keys:
+            pipe.zrem(_band_zset(band_key), entry_id)
+        pipe.execute()
+
+    def signatures(self, entry_ids):
+        entry_ids = list(entry_ids)
+        raw = redis_conn.mget([f"near_dup:sig:{entry_id}" for entry_id in entry_ids]) if entry_ids else []
+        return {
+            entry_id: struct.unpack(f">{len(value) // 8}Q", value)
+            for entry_id, value in zip(entry_ids, raw) if value
+        }
+
+
+class LocalIndex:
+    """In-process index, for a single worker or offline evaluation."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._signatures = {}
+        self._bands = {}
+
+    def add(self, entry_id, sig, band_keys):
+        with self._lock:
+            self._signatures[entry_id] = sig
+            for band_key in band_keys:
+                self._bands.setdefault(band_key, set()).add(entry_id)
+
+    def candidates(self, band_keys):
+        with self._lock:
+            return set().union(*(self._bands.get(band_key, set()) for band_key in band_keys))
+
+    def signatures(self, entry_ids):
+        with self._lock:
+            return {entry_id: self._signatures[entry_id] for entry_id in entry_ids if entry_id in self._signatures}
+
+    def remove(self, entry_id, band_keys):
+        with self._lock:
+            self._signatures.pop(entry_id, None)
+            for band_key in band_keys:
+                self._bands.get(band_key, set()).discard(entry_id)
+
+
+def _build_index():
+    backend = NEAR_DUPLICATE_CONFIG["backend"]
+    if backend == "redis":
+        return RedisIndex()
+    if backend == "local":
+        return LocalIndex()
+    raise ValueError(f"Unsupported near-duplicate index backend: '{backend}'. Use 'redis' or 'local'.")
+
+
+index = _build_index()
+
+
+def add(entry_id: str, code: str, language: str):
+    """Indexes a cached unit under `entry_id` (its semantic hash)."""
+    sig = signature(code, language)
+    try:
+        index.add(entry_id, sig, list(_band_keys(sig, language)))
+    except redis.RedisError as e:
+        logger.warning(f"Could not index near-duplicate entry: {e}")
+
+
+def remove(entry_id: str, language: str):
+    """Drops an entry whose cached review is gone, so lookups stop returning it."""
+    try:
+        sig = index.signatures([entry_id]).get(entry_id)
+        if sig is not None:
+            index.remove(entry_id, list(_band_keys(sig, language)))
+    except redis.RedisError as e:
+        logger.warning(f"Could not remove near-duplicate entry: {e}")
+
+
+def matches(code: str, language: str):
+    """
+    Indexed entries reaching the configured similarity threshold, as
+    (entry_id, similarity) pairs, most similar first.
+    """
+    sig = signature(code, language)
+    try:
+        candidates = index.candidates(list(_band_keys(sig, language)))
+        scored = [
+            (entry_id, similarity(sig, other))
+            for entry_id, other in index.signatures(candidates).items()
+        ]
+    except redis.RedisError as e:
+        logger.warning(f"Near-duplicate index unavailable: {e}")
+        return []
+    scored = [match for match in scored if match[1] >= NEAR_DUPLICATE_CONFIG["threshold"]]
+    return sorted(scored, key=lambda match: (match[1], match[0]), reverse=True)
@@ -0,0 +1,206 @@
+# Per-unit review cache keyed by semantic hash.
+# Files are reviewed as separate top-level functions/classes (service/code_units.py),
+# each cached under the hash of its normalized structure, so an edit to one
+# function leaves the cached reviews of all the others usable. Exact misses
+# fall back to the MinHash index of near-duplicates (service/near_duplicate.py).
+#
+# Reviews are stored zlib-compressed under keys namespaced by the model, adapter
+# and prompt versions, so an upgrade never serves reviews of the previous setup.
+# A small in-process LRU of compressed reviews sits in front of Redis.
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+import redis
+from config.settings import REVIEW_CACHE_CONFIG, NEAR_DUPLICATE_CONFIG
+from service.code_normalizer import get_semantic_hash
+from service import near_duplicate
+from service.task_queue import conn as redis_conn
+from service import worker_stats
+from tools.result_cache import config_fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+def cache_namespace() -> str:
+    """Short hash of the model, adapter and prompt versions that produce reviews."""
+    versions = json.dumps([
+        REVIEW_CACHE_CONFIG["model"],
+        REVIEW_CACHE_CONFIG["adapter"],
+        config_fingerprint(*REVIEW_CACHE_CONFIG["prompt_files"]),
+    ])
+    return hashlib.sha256(versions.encode("utf-8")).hexdigest()[:16]
+
+
+NAMESPACE = cache_namespace()
+
+
+def cache_key(code_hash: str) -> str:
+    return f"review_cache:{NAMESPACE}:{code_hash}"
+
+
+class LocalTier:
+    """In-process LRU of compressed reviews; entries are dropped `ttl_seconds` after they were loaded."""
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.size_bytes = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, blob = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return blob
+
+    def put(self, key, blob):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, blob)
+            self.size_bytes += len(blob)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        _, blob = self._entries.pop(key)
+        self.size_bytes -= len(blob)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+local_tier = LocalTier(REVIEW_CACHE_CONFIG["max_local_entries"], REVIEW_CACHE_CONFIG["local_ttl_seconds"])
+
+
+def _record_local_size():
+    worker_stats.set_values(
+        {"review_cache_local_entries": len(local_tier), "review_cache_local_bytes": local_tier.size_bytes},
+        key=str(os.getpid()),
+    )
+
+
+def _peek(code_hash: str):
+    """
+    The cached review of `code_hash` from Redis, or None, without counting the
+    lookup, refreshing the TTL or filling the local tier.
+    """
+    try:
+        blob = redis_conn.get(cache_key(code_hash))
+    except redis.RedisError as e:
+        logger.warning(f"Review cache unavailable: {e}")
+        return None
+    return json.loads(zlib.decompress(blob)) if blob is not None else None
+
+
+def _load(code_hash: str, record: bool = True):
+    """
+    The cached review of `code_hash`, from the local tier or Redis, or None.
+    Redis hits refresh the entry's TTL and are copied to the local tier.
+    With `record=False` the lookup is left out of the review_cache_* stats.
+    """
+    key = cache_key(code_hash)
+    start = time.perf_counter()
+    blob = local_tier.get(key)
+    stats = {f"review_cache_local_{'hits' if blob is not None else 'misses'}": 1}
+    if blob is None:
+        try:
+            if REVIEW_CACHE_CONFIG["refresh_ttl_on_hit"]:
+                blob = redis_conn.getex(key, ex=REVIEW_CACHE_CONFIG["ttl_seconds"])
+            else:
+                blob = redis_conn.get(key)
+        except redis.RedisError as e:
+            logger.warning(f"Review cache unavailable: {e}")
+        stats[f"review_cache_redis_{'hits' if blob is not None else 'misses'}"] = 1
+        if blob is not None:
+            local_tier.put(key, blob)
+            _record_local_size()
+    review_result = json.loads(zlib.decompress(blob)) if blob is not None else None
+    if record:
+        stats["review_cache_get_seconds_total"] = time.perf_counter() - start
+        stats["review_cache_gets"] = 1
+        worker_stats.incr_values(stats)
+    return review_result
+
+
+def _find_near_duplicate(code: str, language: str, kind: str):
+    """
+    On an exact miss, looks up the most similar cached unit (skipping and
+    unindexing candidates whose review is gone). The
+    review_near_duplicate_hits/misses counters give the hit rate it adds
+    over exact matching, also in "shadow" mode where nothing is served. The
+    candidate is read without counting it as a review cache lookup, and only
+    a served ("on") match refreshes its TTL and enters the local tier.
+    """
+    serve = NEAR_DUPLICATE_CONFIG["mode"] == "on"
+    review_result = None
+    for match in near_duplicate.matches(code, language):
+        review_result = _load(match[0], record=False) if serve else _peek(match[0])
+        if review_result is not None:
+            break
+        # The indexed review has expired or was evicted; stop offering it as a candidate
+        near_duplicate.remove(match[0], language)
+    if review_result is None:
+        worker_stats.incr(f"review_near_duplicate_misses:{kind}")
+        return None
+    similarity = match[1]
+    worker_stats.incr(f"review_near_duplicate_hits:{kind}")
+    worker_stats.incr(f"review_near_duplicate_similarity_sum:{kind}", similarity)
+    logger.info(f"Near-duplicate review found (similarity {similarity:.2f}, mode {NEAR_DUPLICATE_CONFIG['mode']}).")
+    if not serve:
+        return None
+    review_result["near_duplicate_similarity"] = similarity
+    return review_result
+
+
+def get_review(code: str, language: str, kind: str = "file"):
+    """
+    Returns the cached review of a code unit, or None. Hits and misses are
+    counted per unit kind ("function", "class", "module" or "file").
+    """
+    review_result = _load(get_semantic_hash(code, language))
+    worker_stats.incr(f"review_unit_cache_{'hits' if review_result else 'misses'}:{kind}")
+    if review_result is None and NEAR_DUPLICATE_CONFIG["mode"] != "off":
+        review_result = _find_near_duplicate(code, language, kind)
+    return review_result
+
+
+def load_review(code: str, language: str):
+    """The cached review of exactly this unit, or None; no near-duplicate fallback."""
+    return _load(get_semantic_hash(code, language))
+
+
+def store_review(code: str, language: str, review_result: dict):
+    code_hash = get_semantic_hash(code, language)
+    key = cache_key(code_hash)
+    start = time.perf_counter()
+    raw = json.dumps(review_result).encode("utf-8")
+    blob = zlib.compress(raw, REVIEW_CACHE_CONFIG["compression_level"])
+    local_tier.put(key, blob)
+    stored = True
+    try:
+        redis_conn.set(key, blob, ex=REVIEW_CACHE_CONFIG["ttl_seconds"])
+    except redis.RedisError as e:
+        logger.warning(f"Could not cache review: {e}")
+        stored = False
+    worker_stats.incr_values({
+        "review_cache_set_seconds_total": time.perf_counter() - start,
+        "review_cache_sets": 1,
+        "review_cache_uncompressed_bytes_total": len(raw),
+        "review_cache_stored_bytes_total": len(blob),
+    })
+    _record_local_size()
+    if stored and NEAR_DUPLICATE_CONFIG["mode"] != "off":
+        near_duplicate.add(code_hash, code, language)
@@ -0,0 +1,47 @@
+# Storage and completion notifications for manual /review jobs.
+# Workers store the finished result under a TTL and publish on a per-job
+# channel; the API long-polls by subscribing to that channel, so clients get
+# the result as soon as it exists without polling RQ themselves.
+import asyncio
+import json
+from config.settings import REVIEW_RESULT_TTL_SECONDS
+from service.task_queue import conn as redis_conn, async_conn
+
+RESULT_KEY_PREFIX = "review_result:"
+DONE_CHANNEL_PREFIX = "review_done:"
+
+
+def publish_result(job_id: str, payload: dict):
+    """Stores a job's final payload ({"status": ..., ...}) and notifies any waiting clients."""
+    redis_conn.set(RESULT_KEY_PREFIX + job_id, json.dumps(payload), ex=REVIEW_RESULT_TTL_SECONDS)
+    redis_conn.publish(DONE_CHANNEL_PREFIX + job_id, payload["status"])
+
+
+async def get_result(job_id: str):
+    """Returns the stored payload of a finished job, or None."""
+    raw = await async_conn.get(RESULT_KEY_PREFIX + job_id)
+    return json.loads(raw) if raw else None
+
+
+async def wait_for_result(job_id: str, timeout: float):
+    """
+    Returns the job's payload, waiting up to `timeout` seconds for the worker's
+    completion notification. Returns None if the job is still running.
+    """
+    pubsub = async_conn.pubsub()
+    try:
+        # Subscribe before checking, so a result published in between is not missed
+        await pubsub.subscribe(DONE_CHANNEL_PREFIX + job_id)
+        result = await get_result(job_id)
+        if result is not None or timeout <= 0:
+            return result
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while (remaining := deadline - loop.time()) > 0:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+            if message is not None:
+                break
+        return await get_result(job_id)
+    finally:
+        await pubsub.aclose()
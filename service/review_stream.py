@@ -0,0 +1,117 @@
+# Token streaming for manual /review jobs.
+# The worker appends plan/code chunks to a per-job Redis stream as the model
+# generates them; the API relays that stream to the client as server-sent
+# events. A Redis stream (rather than pub/sub) lets a client that connects late
+# or reconnects replay everything from the start.
+import json
+import logging
+import queue
+import threading
+from datetime import datetime, timezone
+import redis
+from config.settings import REVIEW_RESULT_TTL_SECONDS, REVIEW_STREAM_MAX_EVENTS
+from service import worker_stats
+from service.task_queue import conn as redis_conn, async_conn
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY_PREFIX = "review_stream:"
+TERMINAL_EVENTS = ("done", "error")
+CLOSE_TIMEOUT_SECONDS = 10  # How long a finished job waits for its queued events to be written
+
+
+class ReviewStreamPublisher:
+    """
+    Worker side: writes one job's events and measures its time to first token.
+    token() runs on the inference engine's thread, whose micro-batch other
+    requests share, so it only queues the chunk; a publisher thread writes the
+    queued events in one round trip per batch. done() and error() end the
+    stream and wait for everything queued to be written.
+    """
+
+    def __init__(self, job_id: str, enqueued_at: datetime = None):
+        self.key = STREAM_KEY_PREFIX + job_id
+        self.enqueued_at = enqueued_at
+        self.time_to_first_token = None
+        self._events = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f"review-stream-{job_id}", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        ttft_recorded = False
+        closed = False
+        while not closed:
+            events = [self._events.get()]
+            while True:
+                try:
+                    events.append(self._events.get_nowait())
+                except queue.Empty:
+                    break
+            closed = events[-1] is None
+            if not ttft_recorded and self.time_to_first_token is not None:
+                worker_stats.incr_values({
+                    "time_to_first_token_seconds_total": self.time_to_first_token,
+                    "time_to_first_token_samples": 1,
+                })
+                ttft_recorded = True
+            try:
+                self._write([event for event in events if event is not None])
+            except redis.RedisError as e:
+                logger.warning(f"Could not write to review stream {self.key}: {e}")
+
+    def _write(self, events):
+        # Consecutive chunks of one stage become a single stream entry
+        merged = []
+        for event in events:
+            if merged and event["event"] == "token" == merged[-1]["event"] and event["stage"] == merged[-1]["stage"]:
+                merged[-1]["text"] += event["text"]
+            else:
+                merged.append(dict(event))
+        if not merged:
+            return
+        pipe = redis_conn.pipeline()
+        for event in merged:
+            pipe.xadd(self.key, event, maxlen=REVIEW_STREAM_MAX_EVENTS, approximate=True)
+        pipe.expire(self.key, REVIEW_RESULT_TTL_SECONDS)
+        pipe.execute()
+
+    def _close(self, event: dict):
+        self._events.put(event)
+        self._events.put(None)
+        self._thread.join(CLOSE_TIMEOUT_SECONDS)
+
+    def token(self, stage: str, text: str):
+        if self.time_to_first_token is None and self.enqueued_at is not None:
+            enqueued_at = self.enqueued_at
+            if enqueued_at.tzinfo is None:
+                enqueued_at = enqueued_at.replace(tzinfo=timezone.utc)  # RQ stores naive UTC timestamps
+            self.time_to_first_token = (datetime.now(timezone.utc) - enqueued_at).total_seconds()
+        self._events.put({"event": "token", "stage": stage, "text": text})
+
+    def done(self, payload: dict):
+        self._close({"event": "done", "payload": json.dumps(payload)})
+
+    def error(self, message: str):
+        self._close({"event": "error", "payload": json.dumps({"status": "failed", "error": message})})
+
+
+async def iter_events(job_id: str, idle_timeout: float):
+    """
+    API side: yields the job's events as dicts ({"event": ..., ...}) from the
+    beginning of its stream, ending after a terminal event. Yields a single
+    {"event": "timeout"} if nothing arrives for `idle_timeout` seconds.
+    """
+    key = STREAM_KEY_PREFIX + job_id
+    last_id = "0-0"
+    while True:
+        response = await async_conn.xread({key: last_id}, count=100, block=int(idle_timeout * 1000))
+        if not response:
+            yield {"event": "timeout"}
+            return
+        for _, entries in response:
+            for entry_id, fields in entries:
+                last_id = entry_id
+                event = {name.decode("utf-8"): value.decode("utf-8") for name, value in fields.items()}
+                yield event
+                if event["event"] in TERMINAL_EVENTS:
+                    return
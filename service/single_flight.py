@@ -0,0 +1,146 @@
+# Single-flight execution of identical work across workers.
+# When several jobs need the same result at once (the same file in several
+# pull requests or pushes), the first worker takes a Redis lease on its key
+# and computes it; the others wait for the lease to be released and then read
+# the stored result instead of repeating the work. The holder renews its lease
+# from a background thread, so a lease only expires when its holder died, and
+# a waiting worker then takes over.
+import logging
+import threading
+import time
+import uuid
+import redis
+from config.settings import SINGLE_FLIGHT_CONFIG
+from service.task_queue import conn as redis_conn
+from service import worker_stats
+
+logger = logging.getLogger(__name__)
+
+MIN_POLL_SECONDS = 0.05
+DONE = b"done"  # Lease value left behind for lease_seconds once the result is stored
+
+
+def _if_owner(key: str, token: str, action) -> bool:
+    """Applies `action(pipeline)` atomically if `key` still holds `token`."""
+    with redis_conn.pipeline() as pipe:
+        try:
+            pipe.watch(key)
+            if pipe.get(key) != token.encode("utf-8"):
+                return False
+            pipe.multi()
+            action(pipe)
+            pipe.execute()
+            return True
+        except redis.WatchError:
+            return False
+
+
+class Lease:
+    """A Redis lease on `key`, renewed in the background until released."""
+
+    def __init__(self, key: str, token: str):
+        self.key = key
+        self.token = token
+        self.lease_ms = int(SINGLE_FLIGHT_CONFIG["lease_seconds"] * 1000)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._renew, name=f"lease-{key}", daemon=True)
+
+    @classmethod
+    def acquire(cls, key: str):
+        """The lease on `key`, or None while another worker holds it."""
+        lease = cls(key, uuid.uuid4().hex)
+        if not redis_conn.set(key, lease.token, nx=True, px=lease.lease_ms):
+            return None
+        lease._thread.start()
+        return lease
+
+    def _renew(self):
+        while not self._stop.wait(SINGLE_FLIGHT_CONFIG["lease_seconds"] / 3):
+            try:
+                if not _if_owner(self.key, self.token, lambda pipe: pipe.pexpire(self.key, self.lease_ms)):
+                    logger.warning(f"Lost the lease on {self.key}; another worker may repeat the work.")
+                    return
+            except redis.RedisError as e:
+                logger.warning(f"Could not renew the lease on {self.key}: {e}")
+
+    def release(self, done: bool = False):
+        """
+        Ends the lease. With `done`, the key is marked DONE for one more lease
+        period, so waiting workers load the result without taking the lease.
+        """
+        self._stop.set()
+        try:
+            if done:
+                _if_owner(self.key, self.token, lambda pipe: pipe.set(self.key, DONE, px=self.lease_ms))
+            else:
+                _if_owner(self.key, self.token, lambda pipe: pipe.delete(self.key))
+        except redis.RedisError as e:
+            logger.warning(f"Could not release the lease on {self.key}; it expires on its own: {e}")
+
+
+def _is_done(lease_key: str) -> bool:
+    try:
+        return redis_conn.get(lease_key) == DONE
+    except redis.RedisError:
+        return False
+
+
+def run(key: str, load, compute, checkpoint=None):
+    """
+    Returns (result, computed). `load()` reads the stored result of `key` (or
+    None) and `compute()` produces and stores it. Only the worker holding the
+    lease on `key` computes; the others wait until it marks the key DONE and
+    then load. `checkpoint(stage)` is called while waiting, so a superseded job can
+    stop. A waiting worker computes itself once the holder died (its lease
+    expired without a stored result) or after max_wait_seconds.
+    """
+    if not SINGLE_FLIGHT_CONFIG["enabled"]:
+        return compute(), True
+    lease_key = f"single_flight:{key}"
+    waiting_since = None
+    poll_seconds = MIN_POLL_SECONDS
+    while True:
+        try:
+            lease = Lease.acquire(lease_key)
+        except redis.RedisError as e:
+            logger.warning(f"Single-flight lease unavailable, computing without it: {e}")
+            return compute(), True
+        waited = time.perf_counter() - waiting_since if waiting_since is not None else 0.0
+        if lease is not None:
+            try:
+                # The previous holder may have stored the result just before its lease ended
+                result = load()
+                if result is not None:
+                    lease.release()
+                    if waiting_since is not None:
+                        worker_stats.incr_values({"single_flight_coalesced": 1, "single_flight_wait_seconds_total": waited})
+                    return result, False
+                if waiting_since is not None:
+                    logger.info(f"Took over {key} after waiting {waited:.1f}s without a result.")
+                    worker_stats.incr_values({"single_flight_takeovers": 1, "single_flight_wait_seconds_total": waited})
+                worker_stats.incr("single_flight_leaders")
+                result = compute()
+            except BaseException:
+                lease.release()
+                raise
+            lease.release(done=True)
+            return result, True
+
+        if _is_done(lease_key):
+            result = load()
+            if result is not None:
+                worker_stats.incr_values({"single_flight_coalesced": 1, "single_flight_wait_seconds_total": waited})
+                return result, False
+        if waiting_since is None:
+            waiting_since = time.perf_counter()
+            logger.info(f"{key} is being computed by another worker; waiting for its result.")
+        elif time.perf_counter() - waiting_since > SINGLE_FLIGHT_CONFIG["max_wait_seconds"]:
+            worker_stats.incr_values({
+                "single_flight_wait_timeouts": 1,
+                "single_flight_wait_seconds_total": time.perf_counter() - waiting_since,
+            })
+            return compute(), True
+        if checkpoint is not None:
+            checkpoint("single_flight_wait")
+        time.sleep(poll_seconds)
+        poll_seconds = min(poll_seconds * 2, SINGLE_FLIGHT_CONFIG["max_poll_seconds"])
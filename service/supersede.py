@@ -0,0 +1,154 @@
+# Supersession of pull request reviews by newer pushes.
+# The webhook records the latest head SHA of every pull request. Review jobs
+# carry their PR and head SHA in job.meta; when a newer SHA arrives, queued
+# jobs for older SHAs are cancelled and running ones stop at the next stage
+# boundary instead of posting comments on outdated code.
+import logging
+import time
+import redis
+from rq.exceptions import NoSuchJobError
+from rq.job import Job, JobStatus
+from config.settings import PR_HEAD_TTL_SECONDS
+from service.task_queue import conn as redis_conn
+from service import worker_stats
+
+logger = logging.getLogger(__name__)
+
+
+class ReviewSuperseded(Exception):
+    """Raised inside a review job whose head SHA is no longer the PR's latest."""
+
+
+def _head_key(pr_url: str) -> str:
+    return f"pr_head:{pr_url}"
+
+
+def _head_updated_key(pr_url: str) -> str:
+    return f"pr_head_updated:{pr_url}"
+
+
+def _jobs_key(pr_url: str) -> str:
+    return f"pr_jobs:{pr_url}"
+
+
+async def record_head(async_conn, pr_url: str, head_sha: str, updated_at: str = None) -> bool:
+    """
+    Called by the webhook for every push: `head_sha` becomes the PR's latest
+    head, unless an event with a later `updated_at` (the pull request's ISO 8601
+    timestamp) already recorded one. GitHub does not guarantee delivery order,
+    and a late (re)delivery of an older push must not make the newest head look
+    superseded. Returns False for such a stale delivery.
+    """
+    head_key, updated_key = _head_key(pr_url), _head_updated_key(pr_url)
+    async with async_conn.pipeline() as pipe:
+        while True:
+            try:
+                await pipe.watch(head_key, updated_key)
+                recorded = await pipe.get(updated_key)
+                # ISO 8601 UTC timestamps compare correctly as strings
+                if updated_at and recorded and recorded.decode("utf-8") > updated_at:
+                    await pipe.unwatch()
+                    return False
+                pipe.multi()
+                pipe.set(head_key, head_sha, ex=PR_HEAD_TTL_SECONDS)
+                if updated_at:
+                    pipe.set(updated_key, updated_at, ex=PR_HEAD_TTL_SECONDS)
+                await pipe.execute()
+                return True
+            except redis.WatchError:
+                continue  # Another delivery for this PR changed the head meanwhile; compare again
+
+
+def latest_head(pr_url: str):
+    try:
+        head = redis_conn.get(_head_key(pr_url))
+    except redis.RedisError as e:
+        logger.warning(f"Could not read the latest head of {pr_url}: {e}")
+        return None
+    return head.decode("utf-8") if head else None
+
+
+def is_superseded(pr_url: str, head_sha: str) -> bool:
+    """True if a newer head than `head_sha` was pushed. Unknown heads are never superseded."""
+    latest = latest_head(pr_url)
+    return latest is not None and latest != head_sha
+
+
+def job_meta(pr_url: str, head_sha: str) -> dict:
+    return {"pr": pr_url, "head_sha": head_sha}
+
+
+def track_job(job: Job):
+    """Remembers a review job of the PR in job.meta, so a later push can cancel it."""
+    pipe = redis_conn.pipeline()
+    pipe.sadd(_jobs_key(job.meta["pr"]), job.id)
+    pipe.expire(_jobs_key(job.meta["pr"]), PR_HEAD_TTL_SECONDS)
+    pipe.execute()
+
+
+def expected_job_seconds() -> float:
+    """Mean wall time of completed PR review jobs, used to value cancellations."""
+    stats = worker_stats.snapshot()
+    completed = stats.get("pr_review_jobs_completed", 0.0)
+    return stats.get("pr_review_job_seconds_total", 0.0) / completed if completed else 0.0
+
+
+def record_completed_job(seconds: float):
+    worker_stats.incr("pr_review_jobs_completed")
+    worker_stats.incr("pr_review_job_seconds_total", seconds)
+
+
+def cancel_stale_jobs(pr_url: str) -> int:
+    """
+    Cancels the PR's queued review jobs for heads other than its latest one,
+    as recorded by the webhook; the caller's own head may already be stale.
+    Jobs that already started are left to stop at their next stage boundary.
+    Returns the number of cancelled jobs.
+    """
+    head_sha = latest_head(pr_url)
+    if head_sha is None:
+        return 0  # Unknown latest head: every job may still be current
+    jobs_key = _jobs_key(pr_url)
+    job_ids = [job_id.decode("utf-8") for job_id in redis_conn.smembers(jobs_key)]
+    cancelled = 0
+    finished = []
+    for job_id in job_ids:
+        try:
+            job = Job.fetch(job_id, connection=redis_conn)
+        except NoSuchJobError:
+            finished.append(job_id)
+            continue
+        status = job.get_status()
+        if status == JobStatus.QUEUED and job.meta.get("head_sha") != head_sha:
+            job.cancel()
+            finished.append(job_id)
+            cancelled += 1
+        elif status in (JobStatus.FINISHED, JobStatus.FAILED, JobStatus.CANCELED, JobStatus.STOPPED):
+            finished.append(job_id)
+    if finished:
+        redis_conn.srem(jobs_key, *finished)
+    if cancelled:
+        worker_stats.incr("superseded_jobs_cancelled", cancelled)
+        worker_stats.incr("superseded_seconds_saved", cancelled * expected_job_seconds())
+        logger.info(f"Cancelled {cancelled} queued review(s) of {pr_url} superseded by {head_sha[:10]}.")
+    return cancelled
+
+
+class SupersessionCheck:
+    """
+    Stage-boundary check for a running review job: calling it raises
+    ReviewSuperseded once the job's head SHA has been superseded, and values
+    the remaining work as seconds saved.
+    """
+
+    def __init__(self, pr_url: str, head_sha: str):
+        self.pr_url = pr_url
+        self.head_sha = head_sha
+        self.started = time.perf_counter()
+
+    def __call__(self, stage: str = ""):
+        if is_superseded(self.pr_url, self.head_sha):
+            elapsed = time.perf_counter() - self.started
+            worker_stats.incr("superseded_jobs_aborted")
+            worker_stats.incr("superseded_seconds_saved", max(0.0, expected_job_seconds() - elapsed))
+            raise ReviewSuperseded(f"{self.head_sha[:10]} was superseded before '{stage}'")
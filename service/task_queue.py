@@ -1,11 +1,63 @@
 # Redis queue for async tasks
+# Jobs are split into priority lanes (e.g. interactive /review requests ahead
+# of bulk webhook reviews) and, within a lane, into one RQ queue per tenant
+# (repository or API client), named "<lane>:<tenant>". Workers order these
+# queues on every dequeue so that one tenant's backlog cannot starve the
+# others (see service/worker.py).
 import redis
+import redis.asyncio
 from rq import Queue
 import os
+from config.settings import QUEUE_CONFIG
 
 # Connect to Redis using the hostname provided by Docker Compose
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 conn = redis.Redis(host=REDIS_HOST, port=6379)
+# Asyncio client for the API's long-poll and streaming endpoints
+async_conn = redis.asyncio.Redis(host=REDIS_HOST, port=6379)
 
 # Create a default queue for handling review tasks
+# (still drained by the workers, for jobs queued before lanes existed)
 queue = Queue(connection=conn)
+
+LANES = QUEUE_CONFIG["lanes"]
+DEFAULT_TENANT = "default"
+
+
+def lane_tenants_key(lane: str) -> str:
+    """Redis set of the tenants that have (or recently had) jobs in `lane`."""
+    return f"queue_lane_tenants:{lane}"
+
+
+def lane_queue(lane: str, tenant: str) -> Queue:
+    return Queue(f"{lane}:{tenant}", connection=conn)
+
+
+def enqueue(lane: str, tenant: str, func, *args, meta: dict = None, **kwargs):
+    """
+    Enqueues `func` (a dotted path) in the tenant's queue of `lane`. The lane
+    and tenant are kept in job.meta so follow-up jobs can stay in them.
+    """
+    if lane not in LANES:
+        raise ValueError(f"Unknown queue lane '{lane}'. Use one of: {', '.join(LANES)}.")
+    tenant = tenant or DEFAULT_TENANT
+    meta = dict(meta or {}, lane=lane, tenant=tenant)
+    job = lane_queue(lane, tenant).enqueue(func, *args, meta=meta, **kwargs)
+    # Registered after the push: a worker that prunes the tenant as empty re-checks the queue
+    conn.sadd(lane_tenants_key(lane), tenant)
+    return job
+
+
+async def lane_depth(lane: str) -> int:
+    """
+    Number of queued jobs in `lane`, summed over its tenants, in two round
+    trips however many tenants there are. Async, for the API's handlers.
+    """
+    tenants = await async_conn.smembers(lane_tenants_key(lane))
+    if not tenants:
+        return 0
+    pipe = async_conn.pipeline(transaction=False)
+    for tenant in tenants:
+        # Same as Queue.count, without a blocking call per tenant queue
+        pipe.llen(lane_queue(lane, tenant.decode("utf-8")).key)
+    return sum(await pipe.execute())
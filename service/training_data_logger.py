@@ -1,42 +1,185 @@
+# Buffered, process-safe training data log.
+# log_interaction only appends the record to an in-memory buffer; a background
+# thread writes buffered records in batches. Every process (API, worker, forked
+# work horse) writes to its own segment file next to TRAINING_LOG_PATH, so rows
+# of concurrent workers never interleave. Segments rotate by size or age; a
+# rotated ("sealed") segment is appended to a manifest that data/load_dataset.py
+# reads to find all logged data (file names: data/training_log_files.py).
+#
+# Training data log path is defined in config/settings.py
+# For example: TRAINING_LOG_PATH = "training_logs/interactions.csv"
+#   segments: training_logs/interactions-<host>-<pid>-<start time>-<n>.csv
+#   manifest: training_logs/interactions.csv.manifest.jsonl
+import atexit
+import collections
 import csv
+import fcntl
+import io
 import json
+import logging
 import os
-from threading import Lock
-from config.settings import TRAINING_LOG_PATH
+import socket
+import threading
+import time
+from config.settings import TRAINING_LOG_PATH, TRAINING_LOG_CONFIG
+from data.training_log_files import manifest_path_for, segment_prefix_for
 
-# A lock to prevent race conditions when multiple workers write to the same file
-file_lock = Lock()
+logger = logging.getLogger(__name__)
+
+SUPPORTED_FORMATS = (".csv", ".jsonl")
+
+
+class SegmentedLogWriter:
+    """
+    Appends records to per-process segment files of `log_path` (.csv or .jsonl).
+    write() is safe to call from any thread and only buffers; records reach
+    disk within flush_interval_seconds, on flush(), or on close().
+    """
+
+    def __init__(self, log_path: str):
+        self.log_path = log_path
+        self.directory = os.path.dirname(log_path) or "."
+        self.extension = os.path.splitext(log_path)[1].lower()
+        if self.extension not in SUPPORTED_FORMATS:
+            raise ValueError(f"Unsupported log format '{self.extension}'. Please use '.csv' or '.jsonl'.")
+        self.manifest_path = manifest_path_for(log_path)
+        self.host = socket.gethostname()
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+        atexit.register(self.close)
+
+    def _reset(self):
+        """
+        Fresh per-process state. In a forked child this drops the parent's
+        buffered records (the parent writes them), its segment and its flush
+        thread, and replaces locks that may have been held during the fork.
+        """
+        self.pid = os.getpid()
+        self._buffer = collections.deque()
+        self._io_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = None
+        self._fd = None
+        self._segment = None
+        self._segment_seq = 0
+        self._fieldnames = None
+
+    def write(self, record: dict):
+        if self._thread is None:
+            self._start()
+        self._buffer.append(record)
+        if len(self._buffer) >= TRAINING_LOG_CONFIG["max_buffered_records"]:
+            self._wake.set()
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="training-log-flush", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(TRAINING_LOG_CONFIG["flush_interval_seconds"])
+            self._wake.clear()
+            try:
+                self.flush()
+            except OSError as e:
+                logger.warning(f"Could not write training log segment: {e}")
+
+    def flush(self):
+        """Writes all buffered records, then rotates the segment if it is too large or too old."""
+        with self._io_lock:
+            records = []
+            while self._buffer:
+                records.append(self._buffer.popleft())
+            if records:
+                if self._fd is None:
+                    self._open_segment(records[0])
+                data = self._serialize(records)
+                view = memoryview(data)
+                while view:  # os.write may write less than asked
+                    view = view[os.write(self._fd, view):]
+                self._segment["records"] += len(records)
+                self._segment["bytes"] += len(data)
+            if self._fd is not None and (
+                self._segment["bytes"] >= TRAINING_LOG_CONFIG["max_segment_bytes"]
+                or time.time() - self._segment["opened_at"] >= TRAINING_LOG_CONFIG["max_segment_seconds"]
+            ):
+                self._seal_segment()
+
+    def close(self):
+        """Flushes and seals the current segment. Called at exit; work horses call it explicitly."""
+        if os.getpid() != self.pid:
+            return
+        self._closed = True
+        self._wake.set()
+        try:
+            self.flush()
+            with self._io_lock:
+                if self._fd is not None:
+                    self._seal_segment()
+        except OSError as e:
+            logger.warning(f"Could not close training log segment: {e}")
+
+    def _serialize(self, records):
+        if self.extension == ".jsonl":
+            return "".join(json.dumps(record) + "\n" for record in records).encode("utf-8")
+        out = io.StringIO()
+        writer = csv.DictWriter(out, fieldnames=self._fieldnames, extrasaction="ignore")
+        if self._segment["records"] == 0:
+            writer.writeheader()
+        writer.writerows(records)
+        return out.getvalue().encode("utf-8")
+
+    def _open_segment(self, first_record):
+        os.makedirs(self.directory, exist_ok=True)
+        opened_at = time.time()
+        name = (f"{segment_prefix_for(self.log_path)}{self.host}-{self.pid}-"
+                f"{int(opened_at)}-{self._segment_seq}{self.extension}")
+        self._segment_seq += 1
+        self._fd = os.open(os.path.join(self.directory, name), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._segment = {"segment": name, "records": 0, "bytes": 0, "opened_at": opened_at,
+                         "host": self.host, "pid": self.pid}
+        # CSV columns are fixed by the first record of each segment
+        self._fieldnames = list(first_record.keys())
+
+    def _seal_segment(self):
+        os.close(self._fd)
+        self._fd = None
+        entry = dict(self._segment, sealed_at=time.time())
+        line = (json.dumps(entry) + "\n").encode("utf-8")
+        manifest_fd = os.open(self.manifest_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            fcntl.flock(manifest_fd, fcntl.LOCK_EX)  # Processes seal segments concurrently
+            os.write(manifest_fd, line)
+        finally:
+            os.close(manifest_fd)  # Also releases the lock
+        self._segment = None
+
+
+training_log = None
+if not TRAINING_LOG_PATH:
+    logger.warning("TRAINING_LOG_PATH is not set. Skipping interaction logging.")
+else:
+    try:
+        training_log = SegmentedLogWriter(TRAINING_LOG_PATH)
+    except ValueError as e:
+        logger.warning(f"{e} Interaction logging is disabled.")
 
-# Training data log path is defined in config/settings.py
-# For example: TRAINING_LOG_PATH = "training_logs/interactions.csv"
 
 def log_interaction(data: dict):
     """
-    Logs a single agent interaction to a file (CSV or JSON).
+    Logs a single agent interaction (buffered; written in the background).
     The format is determined by the file extension in TRAINING_LOG_PATH.
     """
-    if not TRAINING_LOG_PATH:
-        print("Warning: TRAINING_LOG_PATH is not set. Skipping interaction logging.")
+    if training_log is None:
         return
+    training_log.write(data)
+
 
-    # Ensure the directory exists
-    os.makedirs(os.path.dirname(TRAINING_LOG_PATH), exist_ok=True)
-    
-    file_extension = os.path.splitext(TRAINING_LOG_PATH)[1].lower()
-
-    with file_lock:
-        if file_extension == '.csv':
-            # Check if file exists to determine if we need to write headers
-            file_exists = os.path.isfile(TRAINING_LOG_PATH)
-            with open(TRAINING_LOG_PATH, 'a', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=data.keys())
-                if not file_exists:
-                    writer.writeheader()
-                writer.writerow(data)
-        
-        elif file_extension == '.jsonl': # Using JSON Lines for efficient appending
-            with open(TRAINING_LOG_PATH, 'a', encoding='utf-8') as f:
-                f.write(json.dumps(data) + '\n')
-        
-        else:
-            print(f"Warning: Unsupported log format '{file_extension}'. Please use '.csv' or '.jsonl'.")
+def close_training_log():
+    """Writes out buffered records; needed before os._exit(), which skips atexit handlers."""
+    if training_log is not None:
+        training_log.close()
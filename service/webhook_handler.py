@@ -1,20 +1,19 @@
 from fastapi import APIRouter, Request, HTTPException, status, Depends
+from fastapi.responses import JSONResponse
 import hmac
 import hashlib
 import os
-import httpx
-from .task_queue import queue
-from .worker_tasks import run_review_and_post_comment
+import redis
+from .task_queue import enqueue, async_conn
+from .supersede import record_head, job_meta
+from config.settings import WEBHOOK_DELIVERY_TTL_SECONDS
 
 router = APIRouter()
 
 GITHUB_WEBHOOK_SECRET = os.getenv("GITHUB_WEBHOOK_SECRET")
-GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
 
-SUPPORTED_LANGUAGES = {".py": "python", ".js": "javascript"}
-
-if not GITHUB_WEBHOOK_SECRET or not GITHUB_TOKEN:
-    raise RuntimeError("GITHUB_WEBHOOK_SECRET and GITHUB_TOKEN must be set.")
+if not GITHUB_WEBHOOK_SECRET:
+    raise RuntimeError("GITHUB_WEBHOOK_SECRET must be set.")
 
 async def verify_signature(request: Request):
     signature = request.headers.get("X-Hub-Signature-256")
@@ -26,54 +25,67 @@ async def verify_signature(request: Request):
     if not hmac.compare_digest(expected_signature, signature):
         raise HTTPException(status_code=403, detail="Request signature does not match!")
 
-async def get_pr_files(files_url: str):
-    headers = {"Authorization": f"token {GITHUB_TOKEN}"}
-    async with httpx.AsyncClient() as client:
-        response = await client.get(files_url, headers=headers)
-        response.raise_for_status()
-        return response.json()
-
-async def get_file_content(file_url: str):
-    headers = {"Authorization": f"token {GITHUB_TOKEN}", "Accept": "application/vnd.github.v3.raw"}
-    async with httpx.AsyncClient() as client:
-        response = await client.get(file_url, headers=headers)
-        response.raise_for_status()
-        return response.text
+async def _forget_delivery(dedupe_key):
+    """Lets GitHub's retry of a delivery that failed here go through."""
+    try:
+        await async_conn.delete(dedupe_key)
+    except redis.RedisError:
+        pass  # Redis is failing anyway; the retry may then be dropped as a duplicate
 
 @router.post("/webhook", summary="GitHub Webhook Endpoint", dependencies=[Depends(verify_signature)])
 async def handle_github_webhook(request: Request):
+    """
+    Acknowledges a delivery within milliseconds: listing the PR files and
+    creating the per-file review jobs happens in a single fan-out job on the
+    workers. GitHub retries slow or failed deliveries with the same
+    X-GitHub-Delivery id, so each id is only processed once.
+    """
     payload = await request.json()
     
     if "pull_request" in payload and payload.get("action") in ["opened", "synchronize"]:
         pr = payload["pull_request"]
-        files_url = pr["url"] + "/files"
-        comments_url = pr["comments_url"] # URL for posting general PR comments
-        
+        delivery_id = request.headers.get("X-GitHub-Delivery")
+        dedupe_key = f"webhook_delivery:{delivery_id}"
+
+        head_sha = pr["head"]["sha"]
+
         try:
-            changed_files = await get_pr_files(files_url)
-            jobs_queued = 0
-            
-            for file_info in changed_files:
-                filename = file_info["filename"]
-                file_extension = os.path.splitext(filename)[1]
-                
-                if file_extension in SUPPORTED_LANGUAGES:
-                    language = SUPPORTED_LANGUAGES[file_extension]
-                    file_content = await get_file_content(file_info["contents_url"])
-                    
-                    # Enqueue the new task with all necessary arguments
-                    queue.enqueue(
-                        run_review_and_post_comment,
-                        file_content,
-                        language,
-                        comments_url,
-                        filename
-                    )
-                    jobs_queued += 1
-            
-            return {"status": f"{jobs_queued} review(s) queued"}
-        except httpx.HTTPStatusError as e:
-            raise HTTPException(status_code=500, detail=f"Failed to fetch data from GitHub: {e}")
+            if delivery_id:
+                first_delivery = await async_conn.set(dedupe_key, 1, nx=True, ex=WEBHOOK_DELIVERY_TTL_SECONDS)
+                if not first_delivery:
+                    return {"status": "duplicate_delivery_ignored"}
+        except redis.RedisError as e:
+            raise HTTPException(status_code=503, detail=f"Could not record the delivery: {e}")
 
-    return {"status": "event_received_but_not_processed"}
+        try:
+            # Reviews of earlier heads of this PR are now stale and get cancelled by the workers
+            is_latest = await record_head(async_conn, pr["url"], head_sha, pr.get("updated_at"))
+        except redis.RedisError as e:
+            if delivery_id:
+                await _forget_delivery(dedupe_key)
+            raise HTTPException(status_code=503, detail=f"Could not record the delivery: {e}")
+        if not is_latest:
+            # A late delivery of a push that a newer one already superseded
+            return {"status": "stale_delivery_ignored"}
+
+        try:
+            # Enqueue by dotted path so the API never imports the worker code
+            # Webhook lane, queued per repository so one huge PR cannot starve other repositories
+            repository = pr["base"]["repo"]["full_name"]
+            job = enqueue(
+                "webhook",
+                repository,
+                "service.worker_tasks.fan_out_pull_request",
+                pr["url"],
+                pr["comments_url"], # URL for posting general PR comments
+                head_sha,
+                meta=job_meta(pr["url"], head_sha),
+            )
+        except redis.RedisError as e:
+            if delivery_id:
+                await _forget_delivery(dedupe_key)
+            raise HTTPException(status_code=503, detail=f"Could not queue the review: {e}")
 
+        return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content={"status": "accepted", "job_id": job.id})
+
+    return {"status": "event_received_but_not_processed"}
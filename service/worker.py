@@ -0,0 +1,160 @@
+# RQ worker entry point that keeps the model resident across jobs.
+#
+#   python -m service.worker [lane ...]
+#
+# Without arguments the worker serves the lanes in WORKER_LANES.
+#
+# WORKER_MODE selects how jobs share the loaded agent:
+#   "simple" - jobs run inside the worker process itself (rq SimpleWorker).
+#              Required on CUDA, since a CUDA context does not survive fork().
+#   "fork"   - the model is loaded once in the parent and every job runs in a
+#              forked work horse that inherits the weights copy-on-write.
+#              Keeps RQ's per-job crash isolation; CPU only.
+import logging
+import sys
+import time
+from rq import Worker, SimpleWorker
+from rq.utils import utcnow
+from config.settings import WORKER_MODE, QUEUE_CONFIG
+from service import worker_stats
+from service.admission import record_dequeue
+from service.agent_provider import get_agent
+from service.task_queue import conn, queue, LANES, lane_queue, lane_tenants_key
+from service.training_data_logger import close_training_log
+from tools.analysis_pool import start_pool, stop_pool, preload_analyzers
+
+logger = logging.getLogger(__name__)
+
+
+class PreloadMixin:
+    """Loads the agent before the worker starts listening for jobs."""
+
+    def work(self, *args, **kwargs):
+        self.prepare_analysis()
+        get_agent()
+        return super().work(*args, **kwargs)
+
+    def prepare_analysis(self):
+        # Fork the analyzer processes while this process is still small, then load the model
+        start_pool()
+
+
+def _served_key(lane):
+    return f"queue_lane_served:{lane}"
+
+
+class FairSchedulingMixin:
+    """
+    Dequeues from the "<lane>:<tenant>" queues of `lanes` in priority order:
+    lanes strictly by priority, and within a lane the tenant that has received
+    the least service relative to its weight first (start-time fair queuing).
+    Each tenant's virtual time (jobs served / weight) is shared by all workers
+    in Redis. A tenant that becomes active starts at the lowest virtual time of
+    its lane, so an idle period does not bank credit to burst later.
+    """
+
+    lanes = LANES
+
+    def _tenant_order(self, lane):
+        tenants = [tenant.decode("utf-8") for tenant in conn.smembers(lane_tenants_key(lane))]
+        served = {key.decode("utf-8"): float(value) for key, value in conn.hgetall(_served_key(lane)).items()}
+        active = []
+        for tenant in tenants:
+            if lane_queue(lane, tenant).count:
+                active.append(tenant)
+                continue
+            # Prune idle tenants; re-check after removal in case a job was pushed meanwhile
+            conn.srem(lane_tenants_key(lane), tenant)
+            if lane_queue(lane, tenant).count:
+                conn.sadd(lane_tenants_key(lane), tenant)
+                active.append(tenant)
+            else:
+                conn.hdel(_served_key(lane), tenant)
+        floor = min((served[tenant] for tenant in active if tenant in served), default=0.0)
+        for tenant in active:
+            if tenant not in served:
+                conn.hsetnx(_served_key(lane), tenant, floor)
+                served[tenant] = floor
+        return sorted(active, key=lambda tenant: served[tenant])
+
+    def _schedule(self):
+        ordered = [lane_queue(lane, tenant) for lane in self.lanes for tenant in self._tenant_order(lane)]
+        ordered.append(queue)  # Jobs queued before lanes existed
+        self.queues = ordered
+        self._ordered_queues = ordered[:]
+
+    def dequeue_job_and_maintain_ttl(self, timeout, max_idle_time=None):
+        # rq blocks on a fixed list of queues, so wake up periodically to pick up new tenants
+        idle_since = time.monotonic()
+        while True:
+            self._schedule()
+            poll = timeout if timeout is None else min(timeout, QUEUE_CONFIG["refresh_seconds"])
+            result = super().dequeue_job_and_maintain_ttl(poll, max_idle_time=poll if poll is not None else max_idle_time)
+            if result is not None or timeout is None:
+                return result
+            if max_idle_time is not None and time.monotonic() - idle_since >= max_idle_time:
+                return None
+
+    def execute_job(self, job, queue):
+        lane, tenant = job.meta.get("lane"), job.meta.get("tenant")
+        if lane and tenant:
+            weight = QUEUE_CONFIG["tenant_weights"].get(tenant, 1)
+            conn.hincrbyfloat(_served_key(lane), tenant, 1 / weight)
+            record_dequeue(lane)
+            if job.enqueued_at is not None:
+                wait = (utcnow() - job.enqueued_at).total_seconds()
+                worker_stats.incr(f"queue_wait_seconds_total:{lane}", wait)
+                worker_stats.incr(f"queue_wait_jobs:{lane}")
+                worker_stats.set_value(f"queue_wait_seconds_last:{lane}", wait)
+        return super().execute_job(job, queue)
+
+
+class PreloadingWorker(PreloadMixin, FairSchedulingMixin, Worker):
+    """
+    Fork-after-load worker: each work horse inherits the loaded model. A pool
+    started here would be unusable in the work horses, which start their own
+    analysis pool on first use; the analyzers are imported here so it is warm.
+    """
+
+    def prepare_analysis(self):
+        preload_analyzers()
+
+    def perform_job(self, job, queue):
+        try:
+            return super().perform_job(job, queue)
+        finally:
+            # The work horse leaves through os._exit(), which skips atexit handlers
+            close_training_log()
+            stop_pool()
+
+
+class PreloadingSimpleWorker(PreloadMixin, FairSchedulingMixin, SimpleWorker):
+    """In-process worker: every job reuses the agent of the worker process."""
+
+
+WORKER_CLASSES = {
+    "fork": PreloadingWorker,
+    "simple": PreloadingSimpleWorker,
+}
+
+
+def main(argv=None):
+    lanes = (argv if argv is not None else sys.argv[1:]) or QUEUE_CONFIG["worker_lanes"]
+    unknown = [lane for lane in lanes if lane not in LANES]
+    if unknown:
+        raise ValueError(f"Unknown lanes: {', '.join(unknown)}. Use any of: {', '.join(LANES)}.")
+    worker_class = WORKER_CLASSES.get(WORKER_MODE)
+    if worker_class is None:
+        raise ValueError(f"Unsupported WORKER_MODE '{WORKER_MODE}'. Use one of: {', '.join(WORKER_CLASSES)}.")
+
+    logging.basicConfig(level=logging.INFO)
+    # Keep the configured priority order whatever order the lanes were given in
+    lanes = [lane for lane in LANES if lane in lanes]
+    logger.info(f"Starting {worker_class.__name__} on lanes: {', '.join(lanes)}")
+    worker = worker_class([queue], connection=conn)
+    worker.lanes = lanes
+    worker.work()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# Worker-side counters shared through Redis.
+# RQ workers run in separate (often forked) processes, so in-memory counters
+# would be lost with every work horse. Everything is kept in a single Redis
+# hash instead and exported by the API process on /metrics.
+import logging
+import redis
+from prometheus_client.core import GaugeMetricFamily
+from service.task_queue import conn as redis_conn
+
+logger = logging.getLogger(__name__)
+
+WORKER_STATS_KEY = "worker_stats"
+
+
+def incr(field: str, amount: float = 1):
+    """Adds `amount` to a worker counter. Never raises: stats must not fail a job."""
+    try:
+        redis_conn.hincrbyfloat(WORKER_STATS_KEY, field, amount)
+    except redis.RedisError as e:
+        logger.warning(f"Could not record worker stat '{field}': {e}")
+
+
+def incr_values(amounts: dict):
+    """Adds to several worker counters in one round trip. Never raises."""
+    if not amounts:
+        return
+    try:
+        pipe = redis_conn.pipeline(transaction=False)
+        for field, amount in amounts.items():
+            pipe.hincrbyfloat(WORKER_STATS_KEY, field, amount)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Could not record worker stats: {e}")
+
+
+def set_value(field: str, value: float):
+    """Overwrites a worker gauge (e.g. the duration of the last model load)."""
+    try:
+        redis_conn.hset(WORKER_STATS_KEY, field, value)
+    except redis.RedisError as e:
+        logger.warning(f"Could not record worker stat '{field}': {e}")
+
+
+def set_values(values: dict, prefix: str = "", key: str = ""):
+    """Overwrites several worker gauges at once, as "<prefix><name>:<key>" fields when a key is given."""
+    if not values:
+        return
+    suffix = f":{key}" if key else ""
+    try:
+        redis_conn.hset(WORKER_STATS_KEY, mapping={f"{prefix}{name}{suffix}": value for name, value in values.items()})
+    except redis.RedisError as e:
+        logger.warning(f"Could not record worker stats: {e}")
+
+
+def snapshot() -> dict:
+    """Returns all worker counters as a {name: float} dict."""
+    try:
+        raw = redis_conn.hgetall(WORKER_STATS_KEY)
+    except redis.RedisError as e:
+        logger.warning(f"Could not read worker stats: {e}")
+        return {}
+    return {key.decode("utf-8"): float(value) for key, value in raw.items()}
+
+
+class WorkerStatsCollector:
+    """
+    Prometheus collector that exposes the Redis-backed worker counters.
+    A field named "<stat>:<key>" becomes the gauge <stat> with a `key` label.
+    Every "<name>_hits"/"<name>_misses" pair also yields a "<name>_hit_ratio" gauge.
+    """
+
+    def describe(self):
+        # Without describe(), registering the collector would call collect() and hit Redis at import time
+        return []
+
+    def collect(self):
+        families = {}
+        stats = snapshot()
+        for field, hits in list(stats.items()):
+            stat, _, key = field.partition(":")
+            if stat.endswith("_hits"):
+                misses_field = stat[:-len("_hits")] + "_misses" + (f":{key}" if key else "")
+                lookups = hits + stats.get(misses_field, 0.0)
+                if misses_field in stats and lookups:
+                    ratio_stat = stat[:-len("_hits")] + "_hit_ratio"
+                    stats[ratio_stat + (f":{key}" if key else "")] = hits / lookups
+        for field, value in sorted(stats.items()):
+            stat, _, key = field.partition(":")
+            metric_name = "code_review_worker_" + stat.replace("-", "_")
+            if metric_name not in families:
+                families[metric_name] = GaugeMetricFamily(metric_name, f"Worker statistic '{stat}'.", labels=["key"])
+            families[metric_name].add_metric([key], value)
+        yield from families.values()
@@ -1,14 +1,30 @@
-from agent.agent import CodeReviewAgent
 from service.github_client import post_comment
 from service.training_data_logger import log_interaction
-from service.code_normalizer import get_semantic_hash # Import the new function
-from service.task_queue import conn as redis_conn # Import redis connection
+from service import review_cache
+from service import single_flight
+from service.code_normalizer import get_semantic_hash
+from service.agent_provider import get_agent_for_job
+from service import worker_stats
+from service.review_results import publish_result
+from service.review_stream import ReviewStreamPublisher
+from service.code_units import extract_changed_units, split_units
+from service.github_client import get_async_client, close_async_client
+from service.task_queue import enqueue, DEFAULT_TENANT
+from service import supersede
+from service.supersede import ReviewSuperseded, SupersessionCheck
+from config.settings import REVIEW_SCOPE, MAX_REVIEW_UNITS_PER_FILE, GITHUB_COMMENT_MAX_CHARS
+from tools.result_cache import analysis_cache
+from rq import get_current_job
+import asyncio
 import logging
-import json
+import time
+import os
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+SUPPORTED_LANGUAGES = {".py": "python", ".js": "javascript"}
+
 # ... (format_review_as_comment function remains the same) ...
 def format_review_as_comment(result: dict, filename: str) -> str:
     plan = result.get("plan", "No improvement plan was generated.")
@@ -32,46 +48,238 @@ def format_review_as_comment(result: dict, filename: str) -> str:
     return comment_body.strip()
 
 
-def run_review_and_post_comment(file_content: str, language: str, comments_url: str, filename: str):
+def _record_stats(agent):
+    pid = str(os.getpid())
+    worker_stats.set_values(agent.llm.engine.stats(), prefix="engine_", key=pid)
+    worker_stats.set_values(analysis_cache.stats(), prefix="analysis_cache_", key=pid)
+
+
+def run_review(code: str, language: str, stream: bool = False) -> dict:
     """
-    The main worker task, now with semantic caching.
+    Worker task for manual /review submissions: runs the resident agent,
+    stores the result for GET /review/{job_id} and notifies waiting clients.
+    With `stream`, the plan and improved code are also relayed token by token
+    through the job's Redis stream for the SSE endpoint.
     """
+    job = get_current_job()
+    publisher = ReviewStreamPublisher(job.id, job.enqueued_at) if stream and job is not None else None
     try:
-        # --- New Step: Semantic Caching Logic ---
-        code_hash = get_semantic_hash(file_content, language)
-        cache_key = f"review_cache:{code_hash}"
-        
-        cached_result = redis_conn.get(cache_key)
-        if cached_result:
-            logger.info(f"Cache HIT for {filename} (hash: {code_hash[:10]}...). Using cached result.")
-            review_result = json.loads(cached_result)
+        agent = get_agent_for_job()
+        review_result = agent.run(code, language, on_token=publisher.token if publisher else None)
+        _record_stats(agent)
+        if publisher and publisher.time_to_first_token is not None:
+            review_result["timings"]["time_to_first_token"] = publisher.time_to_first_token
+    except Exception as e:
+        if job is not None:
+            publish_result(job.id, {"status": "failed", "error": str(e)})
+        if publisher:
+            publisher.error(str(e))
+        raise
+
+    payload = {"status": "finished", "result": review_result}
+    if job is not None:
+        publish_result(job.id, payload)
+    if publisher:
+        publisher.done(payload)
+    return review_result
+
+
+def _review_code(code: str, language: str, label: str, kind: str = "file", checkpoint=None) -> dict:
+    """
+    Reviews one code unit through the per-unit semantic cache; fresh reviews are
+    logged for training. Concurrent misses for the same unit in other jobs wait
+    for this review instead of running the agent again (service/single_flight.py).
+    """
+    review_result = review_cache.get_review(code, language, kind)
+    if review_result is not None:
+        logger.info(f"Cache HIT for {label}. Using cached result.")
+    else:
+        def review():
+            logger.info(f"Cache MISS for {label}. Running agent.")
+            agent = get_agent_for_job()
+            result = agent.run(code, language, checkpoint=checkpoint)
+            # Batching, prefix-cache and speculative decoding counters of this worker's engine
+            _record_stats(agent)
+            review_cache.store_review(code, language, result)
+
+            logger.info(f"Logging interaction for {label}...")
+            training_data = {
+                "original_code": code,
+                "improved_code": result.get("improved_code"),
+                "language": language,
+                "reward": result.get("reward"),
+                "notes": result.get("notes"),
+                "plan": result.get("plan")
+            }
+            log_interaction(training_data)
+            return result
+
+        review_result, reviewed = single_flight.run(
+            review_cache.cache_key(get_semantic_hash(code, language)),
+            lambda: review_cache.load_review(code, language),
+            review,
+            checkpoint=checkpoint,
+        )
+        if not reviewed:
+            logger.info(f"Review of {label} was produced by a concurrent job. Using its result.")
+
+    review_result['language'] = language
+    return review_result
+
+
+def _units_to_review(file_content: str, language: str, patch):
+    """
+    The units to review: the ones enclosing the changed hunks under
+    REVIEW_SCOPE="changed_units", otherwise every top-level unit of the file.
+    Either way at most MAX_REVIEW_UNITS_PER_FILE units, since each is an agent
+    run. None means the file is reviewed as a whole: it does not parse, or it
+    has more top-level units than that (e.g. a large new module).
+    """
+    if REVIEW_SCOPE == "changed_units" and patch:
+        units = extract_changed_units(file_content, language, patch)
+        if units and len(units) <= MAX_REVIEW_UNITS_PER_FILE:
+            worker_stats.incr("review_scope_changed_units")
+            return units
+    units = split_units(file_content, language)
+    if units and len(units) <= MAX_REVIEW_UNITS_PER_FILE:
+        worker_stats.incr("review_scope_all_units")
+        return units
+    worker_stats.incr("review_scope_whole_file")
+    return None
+
+
+def _truncate_section(section: str, limit: int) -> str:
+    """Cuts a section to `limit` characters, closing a code block left open by the cut."""
+    note = "\n\n*(Truncated: this review exceeds GitHub's comment size limit.)*"
+    cut = section[:max(limit - len(note) - len("\n```"), 0)]
+    if cut.count("```") % 2:
+        cut += "\n```"
+    return cut + note
+
+
+def _comment_bodies(sections, filename: str):
+    """
+    Joins review sections into as few comments as fit GITHUB_COMMENT_MAX_CHARS.
+    Longer reviews are posted as numbered parts; a single section that is too
+    long on its own is truncated.
+    """
+    separator = "\n\n---\n\n"
+    header_room = len(f"**Review of `{filename}` (part 999/999)**\n\n")
+    limit = GITHUB_COMMENT_MAX_CHARS - header_room
+    bodies = []
+    for section in sections:
+        if len(section) > limit:
+            section = _truncate_section(section, limit)
+        if bodies and len(bodies[-1]) + len(separator) + len(section) <= limit:
+            bodies[-1] += separator + section
         else:
-            logger.info(f"Cache MISS for {filename} (hash: {code_hash[:10]}...). Running agent.")
-            agent = CodeReviewAgent()
-            review_result = agent.run(file_content, language)
-            
-            # Save the new result to the cache with a 24-hour expiration
-            redis_conn.set(cache_key, json.dumps(review_result), ex=86400)
-        # --- End of Caching Logic ---
-
-        review_result['language'] = language
-        
-        logger.info(f"Logging interaction for {filename}...")
-        training_data = {
-            "original_code": file_content,
-            "improved_code": review_result.get("improved_code"),
-            "language": language,
-            "reward": review_result.get("reward"),
-            "notes": review_result.get("notes"),
-            "plan": review_result.get("plan")
-        }
-        log_interaction(training_data)
-
-        logger.info(f"Formatting and posting comment for {filename}...")
-        comment_body = format_review_as_comment(review_result, filename)
-        post_comment(comments_url, comment_body)
+            bodies.append(section)
+    if len(bodies) == 1:
+        return bodies
+    return [f"**Review of `{filename}` (part {i}/{len(bodies)})**\n\n{body}" for i, body in enumerate(bodies, 1)]
+
+
+async def _fetch_reviewable_files(pr_url: str):
+    """(file_info, content) of every supported, non-removed file of the pull request."""
+    try:
+        client = get_async_client()
+        changed_files = await client.get_pr_files(pr_url)
+        supported_files = [
+            file_info for file_info in changed_files
+            if file_info.get("status") != "removed"
+            and os.path.splitext(file_info["filename"])[1] in SUPPORTED_LANGUAGES
+        ]
+        # Fetch all contents concurrently instead of one file after another
+        contents = await client.get_file_contents([file_info["contents_url"] for file_info in supported_files])
+        return list(zip(supported_files, contents))
+    finally:
+        await close_async_client()
+
+
+def fan_out_pull_request(pr_url: str, comments_url: str, head_sha: str = None) -> int:
+    """
+    Worker task enqueued by the webhook: lists the pull request's files,
+    fetches their contents and queues one review job per supported file,
+    tagged with the PR and head SHA. Queued reviews of older heads are
+    cancelled. The review jobs stay in the fan-out job's lane and tenant.
+    Returns the number of review jobs queued.
+    """
+    if head_sha and supersede.is_superseded(pr_url, head_sha):
+        worker_stats.incr("superseded_fan_outs_skipped")
+        logger.info(f"Skipping fan-out of {pr_url} at {head_sha[:10]}: a newer head was pushed.")
+        return 0
+    job = get_current_job()
+    meta = job.meta if job is not None else {}
+    lane, tenant = meta.get("lane", "webhook"), meta.get("tenant", DEFAULT_TENANT)
+    files = asyncio.run(_fetch_reviewable_files(pr_url))
+    if head_sha:
+        # A newer head may have been pushed (and fanned out) while the files were fetched
+        if supersede.is_superseded(pr_url, head_sha):
+            worker_stats.incr("superseded_fan_outs_skipped")
+            logger.info(f"Dropping fan-out of {pr_url} at {head_sha[:10]}: a newer head was pushed during the fetch.")
+            return 0
+        supersede.cancel_stale_jobs(pr_url)
+    for file_info, file_content in files:
+        filename = file_info["filename"]
+        language = SUPPORTED_LANGUAGES[os.path.splitext(filename)[1]]
+        job = enqueue(
+            lane,
+            tenant,
+            "service.worker_tasks.run_review_and_post_comment",
+            file_content,
+            language,
+            comments_url,
+            filename,
+            file_info.get("patch"),  # Absent for binary or very large diffs
+            meta=supersede.job_meta(pr_url, head_sha) if head_sha else None,
+        )
+        if head_sha:
+            supersede.track_job(job)
+    logger.info(f"Queued {len(files)} review(s) for {pr_url}.")
+    return len(files)
+
+
+def run_review_and_post_comment(file_content: str, language: str, comments_url: str, filename: str, patch: str = None):
+    """
+    The main worker task. Files are reviewed per function/class, each unit
+    through the semantic cache, so a push that edits one function reuses the
+    cached reviews of the rest. Given the file's diff `patch`, only the units
+    enclosing the changed hunks are reviewed at all.
+
+    Jobs tagged with a PR and head SHA (job.meta) stop between stages once a
+    newer head is pushed, without posting anything.
+    """
+    job = get_current_job()
+    meta = job.meta if job is not None else {}
+    checkpoint = SupersessionCheck(meta["pr"], meta["head_sha"]) if meta.get("head_sha") else None
+    start = time.perf_counter()
+    try:
+        if checkpoint:
+            checkpoint("start")
+        units = _units_to_review(file_content, language, patch)
+        if not units:
+            review_result = _review_code(file_content, language, filename, checkpoint=checkpoint)
+            sections = [format_review_as_comment(review_result, filename)]
+        else:
+            worker_stats.incr("review_units", len(units))
+            worker_stats.incr("review_unit_lines", sum(unit.end_line - unit.start_line + 1 for unit in units))
+            worker_stats.incr("review_file_lines", len(file_content.splitlines()))
+            sections = []
+            for unit in units:
+                label = f"{filename} · {unit.name} (lines {unit.start_line}-{unit.end_line})"
+                review_result = _review_code(unit.code, language, label, unit.kind, checkpoint)
+                sections.append(format_review_as_comment(review_result, label))
+
+        if checkpoint:
+            checkpoint("post")
+        logger.info(f"Posting comment for {filename}...")
+        for comment_body in _comment_bodies(sections, filename):
+            post_comment(comments_url, comment_body)
+        supersede.record_completed_job(time.perf_counter() - start)
         
         logger.info(f"Successfully processed review for {filename}.")
+    except ReviewSuperseded as e:
+        logger.info(f"Stopped the review of {filename}: {e}")
     except Exception as e:
         logger.error(f"Failed to process review for {filename}: {e}", exc_info=True)
         try:
@@ -0,0 +1,179 @@
+# Warm in-process static analysis engine
+# Running pylint, flake8 or bandit as a subprocess costs a fresh interpreter
+# start (hundreds of milliseconds) plus a temp file per call. This engine keeps
+# a pool of long-lived worker processes that import the tools once and call
+# their Python APIs directly on the code string. Every call still runs in a
+# separate process, so a crashing or hanging tool cannot take the caller down,
+# and each call is bounded by a timeout after which the pool is replaced.
+import contextlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+from config.settings import STATIC_ANALYSIS_CONFIG
+
+# Name under which snippets are linted; pylint derives the module name from it
+SNIPPET_FILENAME = "snippet.py"
+STYLE_DISPLAY_NAME = "style_check"
+
+
+class AnalysisPoolError(Exception):
+    """Raised when the warm pool could not produce a result; callers fall back to subprocesses."""
+
+
+# --- Executed inside the pool's worker processes ---
+
+def _warm_up():
+    """Pool initializer: imports the analyzers so the first call does not pay for it."""
+    try:
+        import pylint.lint  # noqa: F401
+        import pylint.reporters.json_reporter  # noqa: F401
+        import flake8.main.application  # noqa: F401
+        import bandit.core.manager  # noqa: F401
+        # bandit warns that "<stdin>" has no qualified module name on every call
+        logging.getLogger("bandit").setLevel(logging.ERROR)
+    except ImportError:
+        # A missing tool surfaces as an error on its own calls, which fall back to the subprocess path
+        pass
+
+
+@contextlib.contextmanager
+def _stdio(code):
+    """Feeds `code` to the tool as stdin and swallows anything it prints."""
+    old_stdin, old_stdout = sys.stdin, sys.stdout
+    sys.stdin = io.TextIOWrapper(io.BytesIO(code.encode("utf-8")), encoding="utf-8")
+    sys.stdout = io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+    try:
+        yield
+    finally:
+        sys.stdin, sys.stdout = old_stdin, old_stdout
+
+
+def pylint_messages(code):
+    """Same messages as `pylint <file> --output-format=json`, as a list of dicts."""
+    import astroid
+    from pylint.lint import Run
+    from pylint.reporters.json_reporter import JSONReporter
+
+    output = io.StringIO()
+    try:
+        with _stdio(code):
+            Run(["--from-stdin", SNIPPET_FILENAME], reporter=JSONReporter(output), exit=False)
+    finally:
+        # Never let a previous snippet's AST answer for the next one
+        astroid.MANAGER.astroid_cache.pop(SNIPPET_FILENAME[:-3], None)
+    return json.loads(output.getvalue()) if output.getvalue().strip() else []
+
+
+def flake8_issue_count(code):
+    """Same count as the lines printed by `flake8 --stdin-display-name style_check -`."""
+    from flake8 import utils
+    from flake8.main.application import Application
+
+    utils.stdin_get_value.cache_clear()  # flake8 caches stdin for the life of the process
+    try:
+        with _stdio(code):
+            app = Application()
+            app.run(["--stdin-display-name", STYLE_DISPLAY_NAME, "-"])
+    finally:
+        utils.stdin_get_value.cache_clear()
+    return app.result_count
+
+
+def bandit_issue_count(code):
+    """Same count as the "results" of `bandit -f json -`."""
+    from bandit.core import config as bandit_config
+    from bandit.core import manager as bandit_manager
+
+    manager = bandit_manager.BanditManager(bandit_config.BanditConfig(), "file")
+    manager.files_list = ["<stdin>"]
+    manager._parse_file("<stdin>", io.BytesIO(code.encode("utf-8")), manager.files_list)
+    return len(manager.get_issue_list())
+
+
+# --- Caller side ---
+
+_pool = None
+_pool_lock = threading.Lock()
+# Pools inherited through fork(). Only their creator can use them (their handler
+# threads do not survive the fork), and collecting one here would signal the
+# creator's pool, so they are only kept referenced.
+_inherited_pools = []
+
+
+def _forget_inherited_pool():
+    global _pool, _pool_lock
+    _pool_lock = threading.Lock()  # May have been held by another thread during the fork
+    if _pool is not None:
+        _inherited_pools.append(_pool)
+        _pool = None
+
+
+os.register_at_fork(after_in_child=_forget_inherited_pool)
+
+
+def start_pool():
+    """
+    Starts this process's worker processes if they are not running yet. In-process
+    RQ workers call this before loading the model so the pool is forked from a
+    small process; a forked work horse starts its own pool on first use.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("fork" if "fork" in methods else None)
+            _pool = context.Pool(
+                STATIC_ANALYSIS_CONFIG["pool_size"],
+                initializer=_warm_up,
+                maxtasksperchild=STATIC_ANALYSIS_CONFIG["max_tasks_per_worker"],
+            )
+        return _pool
+
+
+def stop_pool():
+    """Terminates this process's pool, e.g. before a work horse exits through os._exit()."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.terminate()
+            _pool = None
+
+
+def preload_analyzers():
+    """
+    Imports the analyzers into this process. Forking RQ workers call this instead
+    of start_pool(), so the pools their work horses start are warm immediately.
+    """
+    _warm_up()
+
+
+def _reset_pool(pool):
+    """
+    Replaces `pool` after one of its calls timed out. Other threads whose calls
+    ran on the same pool time out too; only the first one terminates it, so a
+    pool started meanwhile for everyone else is left alone.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not pool:
+            return
+        _pool = None
+    pool.terminate()
+
+
+def run(func, code, timeout=None):
+    """Runs one of the functions above on `code` in the warm pool."""
+    pool = start_pool()
+    timeout = timeout or STATIC_ANALYSIS_CONFIG["timeout_seconds"]
+    try:
+        return pool.apply_async(func, (code,)).get(timeout)
+    except multiprocessing.TimeoutError:
+        # The hung worker would keep its slot forever; replace the whole pool
+        _reset_pool(pool)
+        raise AnalysisPoolError(f"{func.__name__} timed out after {timeout}s")
+    except Exception as e:
+        raise AnalysisPoolError(f"{func.__name__} failed in the analysis pool: {e}") from e
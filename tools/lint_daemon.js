@@ -0,0 +1,38 @@
+// Long-lived ESLint process used by tools/lint_daemon.py.
+// Keeps ESLint and the project configuration loaded and lints source text
+// received over stdin, so no node start-up or temp file is paid per lint.
+//
+// Protocol: one JSON object per line in each direction.
+//   request:  {"id": 1, "code": "..."}
+//   response: {"id": 1, "messages": [...]}  or  {"id": 1, "error": "..."}
+const readline = require('readline');
+const path = require('path');
+const { ESLint } = require('eslint');
+
+// Lint as if the snippet were a file in the project root so .eslintrc.json applies
+const SNIPPET_PATH = path.join(process.cwd(), 'snippet.js');
+const eslint = new ESLint();
+
+function reply(response) {
+    process.stdout.write(JSON.stringify(response) + '\n');
+}
+
+const input = readline.createInterface({ input: process.stdin, terminal: false });
+
+input.on('line', async (line) => {
+    let request;
+    try {
+        request = JSON.parse(line);
+    } catch (err) {
+        reply({ id: null, error: `Malformed request: ${err.message}` });
+        return;
+    }
+    try {
+        const results = await eslint.lintText(request.code, { filePath: SNIPPET_PATH });
+        reply({ id: request.id, messages: results.length ? results[0].messages : [] });
+    } catch (err) {
+        reply({ id: request.id, error: err.message });
+    }
+});
+
+input.on('close', () => process.exit(0));
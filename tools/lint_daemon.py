@@ -0,0 +1,92 @@
+# Client for the persistent ESLint daemon (tools/lint_daemon.js).
+# Replaces a `node_modules/.bin/eslint <tempfile>` subprocess per lint with a
+# request over the daemon's stdin. The daemon is started on first use and
+# restarted if it dies or stops answering.
+import itertools
+import json
+import os
+import queue
+import subprocess
+import threading
+from config.settings import LINT_DAEMON_CONFIG
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DAEMON_SCRIPT = os.path.join(PROJECT_ROOT, "tools", "lint_daemon.js")
+
+
+class LintDaemonError(Exception):
+    """Raised when the daemon cannot lint a snippet; callers fall back to the eslint CLI."""
+
+
+class ESLintDaemon:
+    """Thread-safe handle on one daemon process. Requests are serialized."""
+
+    def __init__(self, node_path="node", timeout=None):
+        self.node_path = node_path
+        self.timeout = timeout or LINT_DAEMON_CONFIG["timeout_seconds"]
+        self._process = None
+        self._responses = None
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def _start(self):
+        self._process = subprocess.Popen(
+            [self.node_path, DAEMON_SCRIPT],
+            cwd=PROJECT_ROOT,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding="utf-8",
+        )
+        # Reading on a separate thread lets lint() wait with a timeout
+        self._responses = queue.Queue()
+        threading.Thread(
+            target=self._read_responses, args=(self._process, self._responses), daemon=True
+        ).start()
+
+    @staticmethod
+    def _read_responses(process, responses):
+        for line in process.stdout:
+            responses.put(line)
+        responses.put(None)  # EOF: the daemon exited
+
+    def _stop(self):
+        if self._process is not None:
+            self._process.kill()
+            self._process = None
+
+    def lint(self, code):
+        """Returns ESLint's messages for a JavaScript snippet."""
+        with self._lock:
+            try:
+                if self._process is None or self._process.poll() is not None:
+                    self._start()
+                request_id = next(self._ids)
+                self._process.stdin.write(json.dumps({"id": request_id, "code": code}) + "\n")
+                self._process.stdin.flush()
+                while True:
+                    line = self._responses.get(timeout=self.timeout)
+                    if line is None:
+                        raise LintDaemonError("ESLint daemon exited")
+                    response = json.loads(line)
+                    if response.get("id") == request_id:
+                        break
+            except (OSError, queue.Empty, json.JSONDecodeError) as e:
+                self._stop()
+                raise LintDaemonError(f"ESLint daemon failed: {e!r}") from e
+            except LintDaemonError:
+                self._stop()
+                raise
+
+        if "error" in response:
+            raise LintDaemonError(response["error"])
+        return response["messages"]
+
+
+_daemon = ESLintDaemon()
+
+
+def lint_javascript(code):
+    """Lints a snippet with the shared daemon; raises LintDaemonError on failure."""
+    return _daemon.lint(code)
@@ -7,8 +7,23 @@ import json
 import tempfile
 import os
 import re
-from radon.visitors import ComplexityVisitor
-from config.settings import REWARD_WEIGHTS
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config.settings import REWARD_WEIGHTS, STATIC_ANALYSIS_CONFIG, REWARD_CONFIG
+from tools import analysis_pool
+from tools import python_metrics
+from tools.static_analysis import run_eslint
+from tools.result_cache import cached, skip_caching
+
+# Bump when the scoring logic in this module changes, so cached scores are not reused
+METRICS_VERSION = "3"
+
+# Block nesting deeper than this adds to the Python readability score
+MAX_COMFORTABLE_NESTING = 3
+
+logger = logging.getLogger(__name__)
 
 def _run_tool_with_stdin(command, code):
     """Helper to run a command-line tool by passing code via stdin for efficiency."""
@@ -20,82 +35,99 @@ def _run_tool_with_stdin(command, code):
             text=True,
             check=False
         )
+        # flake8 and bandit exit with 1 when they found issues, anything else is an error
+        if process.returncode not in (0, 1):
+            skip_caching(f"{command[0]} exited with {process.returncode}: {process.stderr.strip()[-200:]}")
         return process.stdout
-    except FileNotFoundError:
+    except FileNotFoundError as e:
+        skip_caching(f"{command[0]} is not installed: {e}")
         return ""
 
+def _run_in_pool(func, code):
+    """Runs an analyzer in the warm pool; None means the caller should use the subprocess path."""
+    if STATIC_ANALYSIS_CONFIG["mode"] != "pool":
+        return None
+    try:
+        return analysis_pool.run(func, code)
+    except analysis_pool.AnalysisPoolError as e:
+        logger.warning(f"Falling back to a subprocess: {e}")
+        return None
+
+@cached("style:" + METRICS_VERSION, versions=("flake8", "pycodestyle", "pyflakes", "eslint"),
+        config_files=("setup.cfg", "tox.ini", ".flake8", ".eslintrc.json"))
 def get_style_issues(code, language):
     """Get style issues from flake8 (Python) or eslint (JavaScript)."""
     if language == "python":
+        count = _run_in_pool(analysis_pool.flake8_issue_count, code)
+        if count is not None:
+            return count
         output = _run_tool_with_stdin(['flake8', '--stdin-display-name', 'style_check', '-'], code)
         return len(output.strip().splitlines())
     elif language == "javascript":
-        with tempfile.NamedTemporaryFile(mode='w+', delete=False, suffix=".js") as tmp:
-            tmp.write(code)
-            tmp_path = tmp.name
-        try:
-            eslint_path = os.path.join('.', 'node_modules', '.bin', 'eslint')
-            result = subprocess.run(
-                [eslint_path, tmp_path, '--format', 'json'],
-                capture_output=True, text=True, check=False
-            )
-            os.unlink(tmp_path)
-            if result.stdout:
-                output = json.loads(result.stdout)
-                return len(output[0]['messages']) if output else 0
-            return 0
-        except (FileNotFoundError, IndexError, json.JSONDecodeError):
-            if os.path.exists(tmp_path):
-                os.unlink(tmp_path)
-            return 0
+        # Served by the ESLint daemon and deduplicated with the other lints of this source
+        return len(run_eslint(code))
     return 0
 
+@cached("security:" + METRICS_VERSION, versions=("bandit", "njsscan"), config_files=(".bandit", "pyproject.toml"))
 def get_security_issues(code, language):
     """Get security issues from bandit (Python) or njsscan (JavaScript)."""
     if language == "python":
+        count = _run_in_pool(analysis_pool.bandit_issue_count, code)
+        if count is not None:
+            return count
         output = _run_tool_with_stdin(['bandit', '-f', 'json', '-'], code)
         try:
             results = json.loads(output)
             return len(results.get("results", []))
-        except json.JSONDecodeError:
+        except json.JSONDecodeError as e:
+            skip_caching(f"bandit output is not JSON: {e}")
             return 0
     elif language == "javascript":
-        with tempfile.NamedTemporaryFile(mode='w+', delete=False, suffix=".js") as tmp:
-            tmp.write(code)
-            tmp_path = tmp.name
-        try:
-            njsscan_path = os.path.join('.', 'node_modules', '.bin', 'njsscan')
-            result = subprocess.run(
-                [njsscan_path, '--json', '-f', tmp_path],
-                capture_output=True, text=True, check=False
-            )
-            os.unlink(tmp_path)
-            if result.stdout:
-                # njsscan nests the findings
-                scan_results = json.loads(result.stdout)
-                total_issues = 0
-                for file_key in scan_results:
-                    total_issues += len(scan_results[file_key].get('findings', []))
-                return total_issues
-            return 0
-        except (FileNotFoundError, json.JSONDecodeError):
-            if os.path.exists(tmp_path):
-                os.unlink(tmp_path)
-            return 0
+        return _njsscan_issue_count(code)
     return 0
 
+def _njsscan_issue_count(code):
+    # njsscan is a Python/semgrep tool that only scans files, so it cannot live in the ESLint daemon
+    with tempfile.NamedTemporaryFile(mode='w+', delete=False, suffix=".js") as tmp:
+        tmp.write(code)
+        tmp_path = tmp.name
+    try:
+        njsscan_path = os.path.join('.', 'node_modules', '.bin', 'njsscan')
+        result = subprocess.run(
+            [njsscan_path, '--json', '-f', tmp_path],
+            capture_output=True, text=True, check=False
+        )
+        os.unlink(tmp_path)
+        if result.stdout:
+            # njsscan nests the findings
+            scan_results = json.loads(result.stdout)
+            total_issues = 0
+            for file_key in scan_results:
+                total_issues += len(scan_results[file_key].get('findings', []))
+            return total_issues
+        return 0
+    except (FileNotFoundError, json.JSONDecodeError) as e:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        skip_caching(f"njsscan failed: {e}")
+        return 0
+
+@cached("readability:" + METRICS_VERSION, versions=("eslint",), config_files=(".eslintrc.json",))
 def get_readability_score(code, language):
-    """Get readability score (cyclomatic complexity)."""
+    """
+    Get readability score: cyclomatic complexity plus excess nesting (Python)
+    or eslint issues (JavaScript).
+    """
     if language == "python":
-        try:
-            visitor = ComplexityVisitor.from_code(code)
-            return visitor.total_complexity
-        except Exception:
-            return 25 
+        metrics = python_metrics.analyze(code)
+        if metrics is None:
+            return 25
+        return metrics.complexity + max(0, metrics.max_nesting - MAX_COMFORTABLE_NESTING)
     elif language == "javascript":
         return get_style_issues(code, language)
     return 0
 
+@cached("performance:" + METRICS_VERSION)
 def get_performance_score(code, language):
     """
     Calculates a performance score based on detecting inefficient patterns.
@@ -103,6 +135,10 @@ def get_performance_score(code, language):
     """
     score = 0
     if language == "python":
+        metrics = python_metrics.analyze(code)
+        if metrics is not None:
+            return metrics.loop_appends + metrics.index_iterations
+        # Unparseable code: fall back to textual patterns
         score += len(re.findall(r'\n\s*for\s.*\s+.*\..*append\(', code))
         score += code.count("range(len(")
     elif language == "javascript":
@@ -110,34 +146,85 @@ def get_performance_score(code, language):
         score += code.count(".innerHTML") 
     return score
 
+METRIC_FUNCTIONS = {
+    "readability": get_readability_score,
+    "performance": get_performance_score,
+    "security": get_security_issues,
+    "style": get_style_issues,
+}
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    # Threads do not survive a fork, so a forked RQ work horse builds its own executor
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=REWARD_CONFIG["max_workers"], thread_name_prefix="reward-metric")
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _timed(metric_func, code, language):
+    start = time.perf_counter()
+    score = metric_func(code, language)
+    return score, time.perf_counter() - start
+
+
+def _evaluate_metrics(original_code, improved_code, language):
+    """Returns {(metric, "original"|"improved"): (score, seconds)} for all eight evaluations."""
+    evaluations = [
+        (name, version, code)
+        for name in METRIC_FUNCTIONS
+        for version, code in (("original", original_code), ("improved", improved_code))
+    ]
+    if REWARD_CONFIG["mode"] == "parallel" and REWARD_CONFIG["max_workers"] > 1:
+        executor = _get_executor()
+        futures = {
+            (name, version): executor.submit(_timed, METRIC_FUNCTIONS[name], code, language)
+            for name, version, code in evaluations
+        }
+        return {key: future.result() for key, future in futures.items()}
+    return {
+        (name, version): _timed(METRIC_FUNCTIONS[name], code, language)
+        for name, version, code in evaluations
+    }
+
+
 def calculate_reward(original_code, improved_code, language):
     """
     Computes a weighted reward score based on the delta of multiple metrics.
     """
+    clipped_reward, notes, _ = calculate_reward_with_timings(original_code, improved_code, language)
+    return clipped_reward, notes
+
+
+def calculate_reward_with_timings(original_code, improved_code, language):
+    """
+    Same as `calculate_reward`, plus the seconds each of the eight metric
+    evaluations took, keyed like "style_original" or "security_improved".
+    In "parallel" mode the evaluations run concurrently, so the wall time is
+    roughly that of the slowest one rather than their sum.
+    """
+    results = _evaluate_metrics(original_code, improved_code, language)
     metrics = {}
-    
-    def get_delta(metric_func, original, improved, lang):
-        original_score = metric_func(original, lang)
-        improved_score = metric_func(improved, lang)
+    scores = {}
+    timings = {}
+    for name in METRIC_FUNCTIONS:
+        original_score, timings[f"{name}_original"] = results[(name, "original")]
+        improved_score, timings[f"{name}_improved"] = results[(name, "improved")]
         # Calculate the percentage reduction in issues
         delta = (original_score - improved_score) / max(original_score, 1)
-        return delta, original_score, improved_score
-
-    # 1. Readability
-    readability_delta, orig_read, imp_read = get_delta(get_readability_score, original_code, improved_code, language)
-    metrics['readability'] = readability_delta * REWARD_WEIGHTS['readability']
-
-    # 2. Performance
-    performance_delta, orig_perf, imp_perf = get_delta(get_performance_score, original_code, improved_code, language)
-    metrics['performance'] = performance_delta * REWARD_WEIGHTS['performance']
-
-    # 3. Security
-    security_delta, orig_sec, imp_sec = get_delta(get_security_issues, original_code, improved_code, language)
-    metrics['security'] = security_delta * REWARD_WEIGHTS['security']
+        metrics[name] = delta * REWARD_WEIGHTS[name]
+        scores[name] = (original_score, improved_score)
 
-    # 4. Style
-    style_delta, orig_style, imp_style = get_delta(get_style_issues, original_code, improved_code, language)
-    metrics['style'] = style_delta * REWARD_WEIGHTS['style']
+    orig_read, imp_read = scores['readability']
+    orig_perf, imp_perf = scores['performance']
+    orig_sec, imp_sec = scores['security']
+    orig_style, imp_style = scores['style']
 
     total_reward = sum(metrics.values())
     clipped_reward = max(-1.0, min(1.0, total_reward))
@@ -150,4 +237,4 @@ def calculate_reward(original_code, improved_code, language):
         f"Style: {orig_style}->{imp_style}"
     )
     
-    return clipped_reward, notes
\ No newline at end of file
+    return clipped_reward, notes, timings
\ No newline at end of file
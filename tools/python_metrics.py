@@ -0,0 +1,145 @@
+# Single-pass AST metrics for Python code
+# Parses a snippet once and computes, in one walk, everything the reward's
+# readability and performance scores need: cyclomatic complexity, loops that
+# only append to a list, index-based iteration and block nesting depth.
+import ast
+from dataclasses import dataclass
+from functools import lru_cache
+
+# match (3.10) and except* (3.11) only exist on newer interpreters
+MATCH_NODES = (ast.Match,) if hasattr(ast, "Match") else ()
+TRY_NODES = (ast.Try, ast.TryStar) if hasattr(ast, "TryStar") else (ast.Try,)
+BLOCK_NODES = (
+    ast.If, ast.For, ast.AsyncFor, ast.While, ast.With, ast.AsyncWith,
+) + TRY_NODES + MATCH_NODES
+
+
+@dataclass(frozen=True)
+class PythonMetrics:
+    complexity: int        # 1 + all decision points of the snippet (one base for the whole file, not 1 per function)
+    loop_appends: int      # For loops whose body only appends to a list (a comprehension would do)
+    index_iterations: int  # `for i in range(len(seq))` loops that index `seq[i]`
+    max_nesting: int       # Deepest nesting of block statements (if/for/while/with/try/match)
+
+
+class _MetricsVisitor(ast.NodeVisitor):
+    def __init__(self):
+        self.complexity = 1
+        self.loop_appends = 0
+        self.index_iterations = 0
+        self.max_nesting = 0
+        self._nesting = 0
+
+    def generic_visit(self, node):
+        # Decision points per node follow radon's rules; unlike radon, which starts every
+        # function and class at 1, the snippet is scored as one block with a single base of 1
+        if isinstance(node, (ast.If, ast.IfExp, ast.Assert)):
+            self.complexity += 1
+        elif isinstance(node, (ast.For, ast.AsyncFor, ast.While)):
+            self.complexity += 1 + bool(node.orelse)
+        elif isinstance(node, TRY_NODES):
+            self.complexity += len(node.handlers) + bool(node.orelse)
+        elif isinstance(node, ast.BoolOp):
+            self.complexity += len(node.values) - 1
+        elif isinstance(node, ast.comprehension):
+            self.complexity += 1 + len(node.ifs)
+            if _indexes_range_len(node.target, node.iter, None):
+                self.index_iterations += 1
+        elif isinstance(node, MATCH_NODES):
+            has_wildcard = any(
+                isinstance(case.pattern, ast.MatchAs) and case.pattern.pattern is None
+                for case in node.cases
+            )
+            self.complexity += max(0, len(node.cases) - has_wildcard)
+
+        # Only for loops: a while loop (e.g. draining a queue) has no comprehension equivalent
+        if isinstance(node, (ast.For, ast.AsyncFor)) and _only_appends(node.body):
+            self.loop_appends += 1
+        if isinstance(node, (ast.For, ast.AsyncFor)) and _indexes_range_len(node.target, node.iter, node.body):
+            self.index_iterations += 1
+
+        if isinstance(node, BLOCK_NODES):
+            self._nesting += 1
+            self.max_nesting = max(self.max_nesting, self._nesting)
+            super().generic_visit(node)
+            self._nesting -= 1
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)):
+            # Nesting is measured per function, not across definitions
+            outer, self._nesting = self._nesting, 0
+            super().generic_visit(node)
+            self._nesting = outer
+        else:
+            super().generic_visit(node)
+
+
+def _is_append(stmt):
+    return (
+        isinstance(stmt, ast.Expr)
+        and isinstance(stmt.value, ast.Call)
+        and isinstance(stmt.value.func, ast.Attribute)
+        and stmt.value.func.attr == "append"
+        and len(stmt.value.args) == 1
+        and not stmt.value.keywords
+    )
+
+
+def _only_appends(body):
+    """True for `append(x)` alone, or guarded by a single else-less `if`."""
+    if len(body) != 1:
+        return False
+    stmt = body[0]
+    if isinstance(stmt, ast.If) and not stmt.orelse and len(stmt.body) == 1:
+        stmt = stmt.body[0]
+    return _is_append(stmt)
+
+
+def _indexes_range_len(target, iterable, body):
+    """
+    True for `range(len(seq))` iteration whose index is used to subscript
+    `seq`. With `body` None (comprehensions) the range(len()) form alone counts.
+    """
+    if not (
+        isinstance(target, ast.Name)
+        and isinstance(iterable, ast.Call)
+        and isinstance(iterable.func, ast.Name)
+        and iterable.func.id == "range"
+        and len(iterable.args) == 1
+        and isinstance(iterable.args[0], ast.Call)
+        and isinstance(iterable.args[0].func, ast.Name)
+        and iterable.args[0].func.id == "len"
+        and len(iterable.args[0].args) == 1
+    ):
+        return False
+    if body is None:
+        return True
+    sequence = ast.dump(iterable.args[0].args[0])
+    for stmt in body:
+        for node in ast.walk(stmt):
+            if (
+                isinstance(node, ast.Subscript)
+                and isinstance(node.slice, ast.Name)
+                and node.slice.id == target.id
+                and ast.dump(node.value) == sequence
+            ):
+                return True
+    return False
+
+
+@lru_cache(maxsize=256)
+def analyze(code):
+    """
+    PythonMetrics for a snippet, or None if it does not parse. Cached, so the
+    readability and performance scores of one source share a single parse.
+    """
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return None
+    visitor = _MetricsVisitor()
+    visitor.visit(tree)
+    return PythonMetrics(
+        complexity=visitor.complexity,
+        loop_appends=visitor.loop_appends,
+        index_iterations=visitor.index_iterations,
+        max_nesting=visitor.max_nesting,
+    )
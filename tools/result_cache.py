@@ -0,0 +1,238 @@
+# Content-addressed cache for analyzer and metric outputs
+# Results are keyed by a hash of the source code, the tool, the installed tool
+# versions and the tool configuration, so the same code is never analyzed twice
+# with the same setup: not within a review (Planner and Reflector lint the same
+# original), not across reviews, and not across PPO epochs over one dataset.
+# An in-process LRU sits in front of a shared backend (Redis or local disk).
+import functools
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from importlib import metadata
+import redis
+from config.settings import ANALYSIS_CACHE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Per thread, one flag per cached computation in progress (innermost last)
+_computing = threading.local()
+
+
+def skip_caching(reason):
+    """
+    Called by an analyzer that could not run its tool (not installed, crashed,
+    unreadable output) before it returns a fallback result. The fallback is
+    returned but not cached, and neither is any cached result computed from it.
+    """
+    stack = getattr(_computing, "stack", None)
+    if stack:
+        stack[-1] = True
+    logger.warning(f"Not caching an analyzer result: {reason}")
+
+
+class RedisBackend:
+    """Shared tier for all workers; entries expire after `ttl_seconds`."""
+
+    def __init__(self, ttl_seconds):
+        self.ttl_seconds = ttl_seconds
+        self.client = redis.Redis(host=os.getenv("REDIS_HOST", "localhost"), port=6379, socket_connect_timeout=1)
+
+    def get(self, key):
+        return self.client.get("analysis_cache:" + key)
+
+    def set(self, key, value):
+        self.client.set("analysis_cache:" + key, value, ex=self.ttl_seconds)
+
+
+class DiskBackend:
+    """Local tier for single-machine use (e.g. PPO training); keeps at most `max_entries` files."""
+
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        self._writes = 0
+
+    def _file(self, key):
+        return os.path.join(self.path, key[:2], key + ".json")
+
+    def get(self, key):
+        try:
+            with open(self._file(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, key, value):
+        path = self._file(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(value)
+        os.replace(tmp_path, path)  # Atomic, so concurrent readers never see a partial file
+        self._writes += 1
+        if self._writes % 1000 == 0:
+            self._evict()
+
+    def _evict(self):
+        entries = []
+        for root, _, files in os.walk(self.path):
+            entries.extend(os.path.join(root, name) for name in files if name.endswith(".json"))
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda p: os.path.getmtime(p))
+        for path in entries[:len(entries) - self.max_entries]:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+
+class AnalysisCache:
+    """Two-tier (in-process LRU + backend) cache of JSON-serializable results."""
+
+    def __init__(self, max_local_entries, backend=None):
+        self.max_local_entries = max_local_entries
+        self.backend = backend
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"local_hits": 0, "backend_hits": 0, "misses": 0, "evictions": 0, "backend_errors": 0,
+                       "uncached_failures": 0}
+
+    @staticmethod
+    def make_key(tool, fingerprint, code):
+        digest = hashlib.sha256()
+        for part in (tool, fingerprint, code):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _store_local(self, key, value):
+        with self._lock:
+            self._local[key] = value
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_local_entries:
+                self._local.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            if key in self._local:
+                self._local.move_to_end(key)
+                self._stats["local_hits"] += 1
+                return self._local[key]
+
+        if self.backend is not None:
+            try:
+                raw = self.backend.get(key)
+            except (redis.RedisError, OSError) as e:
+                logger.warning(f"Analysis cache backend unavailable: {e}")
+                self._count("backend_errors")
+                raw = None
+            if raw is not None:
+                value = json.loads(raw)
+                self._count("backend_hits")
+                self._store_local(key, value)
+                return value
+
+        self._count("misses")
+        stack = _computing.__dict__.setdefault("stack", [])
+        stack.append(False)
+        try:
+            value = compute()
+        finally:
+            failed = stack.pop()
+        # Round-trip through JSON so hits and misses return the same types
+        raw = json.dumps(value)
+        value = json.loads(raw)
+        if failed:
+            if stack:
+                stack[-1] = True  # The enclosing computation used this fallback
+            self._count("uncached_failures")
+            return value
+        self._store_local(key, value)
+        if self.backend is not None:
+            try:
+                self.backend.set(key, raw.encode("utf-8"))
+            except (redis.RedisError, OSError) as e:
+                logger.warning(f"Analysis cache backend unavailable: {e}")
+                self._count("backend_errors")
+        return value
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["local_entries"] = len(self._local)
+        lookups = stats["local_hits"] + stats["backend_hits"] + stats["misses"]
+        stats["hit_ratio"] = (stats["local_hits"] + stats["backend_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+@functools.lru_cache(maxsize=None)
+def tool_version(name):
+    """Installed version of a Python distribution, or of an npm package in node_modules."""
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        pass
+    try:
+        with open(os.path.join(PROJECT_ROOT, "node_modules", name, "package.json"), encoding="utf-8") as f:
+            return json.load(f).get("version", "")
+    except (OSError, json.JSONDecodeError):
+        return ""
+
+
+@functools.lru_cache(maxsize=None)
+def config_fingerprint(*paths):
+    """Hash of the contents of the given (project-relative) config files that exist."""
+    digest = hashlib.sha256()
+    for path in paths:
+        try:
+            with open(os.path.join(PROJECT_ROOT, path), "rb") as f:
+                digest.update(path.encode("utf-8") + b"\0" + f.read() + b"\0")
+        except OSError:
+            continue
+    return digest.hexdigest()
+
+
+def _build_backend():
+    backend = ANALYSIS_CACHE_CONFIG["backend"]
+    if backend == "redis":
+        return RedisBackend(ANALYSIS_CACHE_CONFIG["ttl_seconds"])
+    if backend == "disk":
+        return DiskBackend(ANALYSIS_CACHE_CONFIG["disk_path"], ANALYSIS_CACHE_CONFIG["max_disk_entries"])
+    if backend == "none":
+        return None
+    raise ValueError(f"Unsupported analysis cache backend: '{backend}'. Use 'redis', 'disk' or 'none'.")
+
+
+analysis_cache = AnalysisCache(ANALYSIS_CACHE_CONFIG["max_local_entries"], _build_backend())
+
+
+def cached(tool, versions=(), config_files=()):
+    """
+    Caches a `func(code, *args)` analyzer in `analysis_cache`. The key covers
+    the code, the extra arguments (e.g. the language), the versions of the
+    `versions` packages and the contents of `config_files`. Versions and
+    config are read once per process.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(code, *args):
+            fingerprint = json.dumps([
+                list(args),
+                [tool_version(name) for name in versions],
+                config_fingerprint(*config_files),
+            ])
+            key = AnalysisCache.make_key(tool, fingerprint, code)
+            return analysis_cache.get_or_compute(key, lambda: func(code, *args))
+        return wrapper
+    return decorator
@@ -1,9 +1,26 @@
 import subprocess
 import json
+import logging
 import os
 import tempfile
+from config.settings import STATIC_ANALYSIS_CONFIG, LINT_DAEMON_CONFIG
+from tools import analysis_pool
+from tools import lint_daemon
+from tools.result_cache import cached, skip_caching
 
+logger = logging.getLogger(__name__)
+
+@cached("pylint", versions=("pylint", "astroid"), config_files=(".pylintrc", "pylintrc", "setup.cfg", "tox.ini", "pyproject.toml"))
 def run_pylint(code):
+    """Pylint messages for a Python snippet, from the warm analysis pool when enabled."""
+    if STATIC_ANALYSIS_CONFIG["mode"] == "pool":
+        try:
+            return analysis_pool.run(analysis_pool.pylint_messages, code)
+        except analysis_pool.AnalysisPoolError as e:
+            logger.warning(f"Falling back to the pylint subprocess: {e}")
+    return _run_pylint_subprocess(code)
+
+def _run_pylint_subprocess(code):
     with tempfile.NamedTemporaryFile(mode='w+', delete=False, suffix=".py") as tmp:
         tmp.write(code)
         tmp_path = tmp.name
@@ -18,12 +35,32 @@ def run_pylint(code):
         os.unlink(tmp_path)
         if result.stdout:
             return json.loads(result.stdout)
+        if result.returncode & 1 or result.returncode & 32:  # Fatal message or usage error
+            skip_caching(f"pylint exited with {result.returncode}: {result.stderr.strip()[-200:]}")
         return []
-    except (FileNotFoundError, json.JSONDecodeError):
+    except (FileNotFoundError, json.JSONDecodeError) as e:
         os.unlink(tmp_path)
+        skip_caching(f"pylint failed: {e}")
         return []
 
 def run_eslint(code):
+    """
+    ESLint messages for a JavaScript snippet. Results are cached by content,
+    so a review lints each distinct source once even though planning, style
+    and readability scoring all ask for it.
+    """
+    return list(_eslint_messages(code))
+
+@cached("eslint", versions=("eslint",), config_files=(".eslintrc.json",))
+def _eslint_messages(code):
+    if LINT_DAEMON_CONFIG["enabled"]:
+        try:
+            return lint_daemon.lint_javascript(code)
+        except lint_daemon.LintDaemonError as e:
+            logger.warning(f"Falling back to the eslint CLI: {e}")
+    return _run_eslint_subprocess(code)
+
+def _run_eslint_subprocess(code):
     with tempfile.NamedTemporaryFile(mode='w+', delete=False, suffix=".js") as tmp:
         tmp.write(code)
         tmp_path = tmp.name
@@ -40,9 +77,12 @@ def run_eslint(code):
         if result.stdout:
             output = json.loads(result.stdout)
             return output[0].get('messages', []) if output else []
+        if result.returncode == 2:  # Configuration problem or internal error
+            skip_caching(f"eslint exited with 2: {result.stderr.strip()[-200:]}")
         return []
-    except (FileNotFoundError, json.JSONDecodeError):
+    except (FileNotFoundError, json.JSONDecodeError) as e:
         os.unlink(tmp_path)
+        skip_caching(f"eslint failed: {e}")
         return []
 
 def analyze_code(code, language):